@@ -0,0 +1,128 @@
+'''Micro-benchmark of websocket frame encode/decode across payload sizes
+
+    python -m benchmark.abnf [--sizes 64,1024,...] [--number N]
+
+`encode` is `ABNF.format` of a masked binary frame, i.e. what `send_audio`
+does per chunk. `decode` is `frame_buffer.recv_frame` of an unmasked binary
+frame read from a socket pair, i.e. what precedes `on_data` per audio frame.
+Each mask backend and both receive paths (`recv` and `recv_into`) are
+measured, together with the former list based `recv_strict` as a baseline.
+Cases compared with each other run interleaved after one warm-up round, so
+that none of them benefits from running later. Numbers are MiB/s, best of
+three rounds.
+'''
+import argparse
+import os
+import socket
+import threading
+import time
+import timeit
+import typing as t
+
+from lib.third_party.nls.websocket import _abnf
+from lib.third_party.nls.websocket._abnf import ABNF, frame_buffer
+
+
+SIZES = (64, 640, 3200, 16384, 65536, 1 << 20)
+
+
+class LegacyFrameBuffer(frame_buffer):
+    '''`recv_strict` as it was: a list of chunks joined on every call'''
+
+    def __init__(self, recv_fn: t.Callable[[int], bytes]) -> None:
+        super().__init__(recv_fn, True)
+        self.recv_buffer = []
+
+    def recv_strict(self, bufsize: int) -> bytes:
+        shortage = bufsize - sum(map(len, self.recv_buffer))
+        while shortage > 0:
+            bytes_ = self.recv(min(16384, shortage))
+            self.recv_buffer.append(bytes_)
+            shortage -= len(bytes_)
+        unified = b''.join(self.recv_buffer)
+        if shortage == 0:
+            self.recv_buffer = []
+            return unified
+        self.recv_buffer = [unified[bufsize:]]
+        return unified[:bufsize]
+
+
+DECODERS = {
+    'decode[legacy]': lambda sock: LegacyFrameBuffer(sock.recv),
+    'decode[recv]': lambda sock: frame_buffer(sock.recv, True),
+    'decode[recv_into]': lambda sock: frame_buffer(sock.recv, True, sock.recv_into),
+}
+
+
+def decode(factory: t.Callable[[socket.socket], frame_buffer], frame: bytes, number: int) -> float:
+    '''Seconds per frame, the frames are written by another thread'''
+    reader, writer = socket.socketpair()
+    thread = threading.Thread(target=lambda: [writer.sendall(frame) for _ in range(number)])
+    with reader, writer:
+        buffer = factory(reader)
+        thread.start()
+        start = time.perf_counter()
+        for _ in range(number):
+            buffer.recv_frame()
+        seconds = time.perf_counter() - start
+        thread.join()
+    return seconds / number
+
+
+def masks() -> t.Dict[str, t.Callable[[bytes, bytes], bytes]]:
+    backends = {'default': _abnf._mask}
+    for name in ('_mask_int', '_mask_numpy'):
+        if hasattr(_abnf, name):
+            backends[name[6:]] = getattr(_abnf, name)
+    return backends
+
+
+def bench(function: t.Callable[[], t.Any], number: int) -> float:
+    '''Seconds per call'''
+    return timeit.timeit(function, number=number) / number
+
+
+def compare(cases: t.Dict[str, t.Callable[[], float]], rounds: int = 3) -> t.Dict[str, float]:
+    '''Best of `rounds` of each case, interleaved after a discarded warm-up round'''
+    for case in cases.values():
+        case()
+    best = dict.fromkeys(cases, float('inf'))
+    for _ in range(rounds):
+        for name, case in cases.items():
+            best[name] = min(best[name], case())
+    return best
+
+
+def main(sizes: t.Sequence[int], number: int) -> None:
+    mask_key = os.urandom(4)
+    rows = {}
+    for size in sizes:
+        data = os.urandom(size)
+        results = compare({
+            f'mask[{name}]': lambda mask=mask: bench(lambda: mask(mask_key, data), number)
+            for name, mask in masks().items()
+        })
+        frame = ABNF.create_frame(data, ABNF.OPCODE_BINARY)
+        results.update(compare({'encode': lambda: bench(frame.format, number)}))
+        frame = ABNF(1, 0, 0, 0, ABNF.OPCODE_BINARY, 0, data).format()
+        results.update(compare({
+            name: lambda factory=factory: decode(factory, frame, number)
+            for name, factory in DECODERS.items()
+        }))
+        for name, seconds in results.items():
+            rows.setdefault(name, []).append(seconds)
+    print(f'{"case":<24}' + ''.join(f'{size:>12}' for size in sizes))
+    for name, row in rows.items():
+        report(name, sizes, row)
+
+
+def report(name: str, sizes: t.Sequence[int], seconds: t.Sequence[float]) -> None:
+    print(f'{name:<24}' + ''.join(f'{size/s/1024**2:>12.1f}' for size, s in zip(sizes, seconds)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)))
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+    main([int(size) for size in args.sizes.split(',')], args.number)
@@ -0,0 +1,303 @@
+'''Local stand-ins for the NLS gateway, CreateToken, filetrans and OSS
+
+    python -m benchmark.mock [--latency S] [--frame-size N] [--frames N] [--error-rate P]
+
+The websocket server speaks enough of the NLS protocol for `lib.nls`,
+`lib.transcriber` and the vendored clients: StartSynthesis is answered by
+`frames` binary frames of `frame_size` bytes and SynthesisCompleted,
+transcription and recognition get Started, one SentenceEnd per `sentence`
+seconds of audio and Completed on stop. The HTTP server answers the RPC
+actions CreateToken, SubmitTask and GetTaskResult (RUNNING for the first
+`polls` queries), and OSS PutObject, HeadObject, DeleteObject and
+DeleteMultipleObjects with path style URLs. Every request waits `latency`
+seconds, and fails with probability `error_rate` where the protocol has a
+way to say so.
+
+Both servers run in a child process by `Mock`, so that threads and memory
+measured by the benchmark belong to the client only.
+'''
+import argparse
+import asyncio
+import base64
+import hashlib
+import http.server
+import json
+import multiprocessing as mp
+import random
+import struct
+import threading
+import time
+import typing as t
+import urllib.parse as up
+import uuid
+import xml.etree.ElementTree as et
+
+from lib.third_party.nls.websocket._abnf import ABNF
+
+
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+BYTES_PER_SECOND = 16000 * 2
+
+
+class Options(t.NamedTuple):
+    latency: float = 0.0
+    frame_size: int = 3200
+    frames: int = 10
+    error_rate: float = 0.0
+    sentence: float = 5.0
+    polls: int = 1
+
+
+class Mock:
+    '''Run both servers in a child process for the duration of a `with` block'''
+
+    def __init__(self, **kwargs: t.Any) -> None:
+        self._options = Options(**kwargs)
+        self._process = None
+        self._ports = None
+
+    def __enter__(self) -> 'Mock':
+        queue = mp.Queue()
+        self._process = mp.Process(target=serve, args=(self._options, queue), daemon=True)
+        self._process.start()
+        self._ports = queue.get(timeout=30)
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self._process.terminate()
+        self._process.join()
+
+    @property
+    def ws_url(self) -> str:
+        return f'ws://127.0.0.1:{self._ports[0]}/ws/v1'
+
+    @property
+    def http_url(self) -> str:
+        return f'http://127.0.0.1:{self._ports[1]}'
+
+
+def serve(options: Options, queue: t.Optional[mp.Queue] = None) -> None:
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), HttpHandler)
+    httpd.daemon_threads = True
+    httpd.options, httpd.objects, httpd.tasks = options, {}, {}
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    async def main() -> None:
+        server = await asyncio.start_server(
+            lambda reader, writer: NlsSession(reader, writer, options).run(),
+            '127.0.0.1', 0,
+        )
+        ports = (server.sockets[0].getsockname()[1], httpd.server_address[1])
+        if queue is None:
+            print(f'ws://127.0.0.1:{ports[0]}/ws/v1 http://127.0.0.1:{ports[1]}')
+        else:
+            queue.put(ports)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+class NlsSession:
+    '''One websocket connection, several tasks may run on it one after another'''
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, options: Options) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._options = options
+        self._header = None
+        self._received = 0
+        self._sent = 0
+
+    async def run(self) -> None:
+        try:
+            await self._handshake()
+            while True:
+                opcode, data = await self._recv()
+                if opcode == ABNF.OPCODE_CLOSE:
+                    self._send(data, ABNF.OPCODE_CLOSE)
+                    break
+                elif opcode == ABNF.OPCODE_PING:
+                    self._send(data, ABNF.OPCODE_PONG)
+                elif opcode == ABNF.OPCODE_BINARY:
+                    await self._audio(len(data))
+                elif opcode == ABNF.OPCODE_TEXT:
+                    await self._command(json.loads(data))
+                await self._writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writer.close()
+
+    async def _handshake(self) -> None:
+        request = (await self._reader.readuntil(b'\r\n\r\n')).decode()
+        # NlsCore sends a fixed Sec-WebSocket-Key after the generated one, the first counts
+        key = next(
+            line.split(':', 1)[1].strip()
+            for line in request.split('\r\n')[1:]
+            if line.lower().startswith('sec-websocket-key:')
+        )
+        accept = base64.b64encode(hashlib.sha1((key+GUID).encode()).digest()).decode()
+        self._writer.write((
+            'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+            f'Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n'
+        ).encode())
+
+    async def _recv(self) -> t.Tuple[int, bytes]:
+        b1, b2 = await self._reader.readexactly(2)
+        length = b2 & 0x7f
+        if length == 126:
+            length, = struct.unpack('!H', await self._reader.readexactly(2))
+        elif length == 127:
+            length, = struct.unpack('!Q', await self._reader.readexactly(8))
+        mask_key = await self._reader.readexactly(4) if b2 & 0x80 else None
+        data = await self._reader.readexactly(length)
+        return b1 & 0x0f, ABNF.mask(mask_key, data) if mask_key else data
+
+    def _send(self, data: t.Union[bytes, str], opcode: int = ABNF.OPCODE_TEXT) -> None:
+        if isinstance(data, str):
+            data = data.encode()
+        self._writer.write(ABNF(1, 0, 0, 0, opcode, 0, data).format())
+
+    def _reply(self, name: str, **payload: t.Any) -> None:
+        header = {**self._header, 'name': name, 'status': 20000000, 'message_id': uuid.uuid4().hex}
+        self._send(json.dumps({'header': header, 'payload': payload}))
+
+    async def _command(self, message: t.Dict[str, t.Any]) -> None:
+        name = message['header']['name']
+        await asyncio.sleep(self._options.latency)
+        if name.startswith('Start'):
+            self._header = {k: message['header'][k] for k in ('task_id', 'namespace')}
+            self._received = self._sent = 0
+            if random.random() < self._options.error_rate:
+                header = {**self._header, 'status': 40000000}
+                self._send(json.dumps({'header': {**header, 'name': 'TaskFailed'}}))
+                return
+        if name == 'StartSynthesis':
+            self._reply('MetaInfo')
+            for _ in range(self._options.frames):
+                self._send(bytes(self._options.frame_size), ABNF.OPCODE_BINARY)
+                await self._writer.drain()
+            self._reply('SynthesisCompleted')
+        elif name == 'StartTranscription':
+            self._reply('TranscriptionStarted')
+        elif name == 'StartRecognition':
+            self._reply('RecognitionStarted')
+        elif name == 'StopTranscription':
+            await self._audio(0, final=True)
+            self._reply('TranscriptionCompleted')
+        elif name == 'StopRecognition':
+            self._reply('RecognitionCompleted', result='')
+
+    async def _audio(self, size: int, final: bool = False) -> None:
+        self._received += size
+        step = int(self._options.sentence * BYTES_PER_SECOND)
+        while self._received-self._sent >= step or (final and self._received > self._sent):
+            begin = self._sent * 1000 // BYTES_PER_SECOND
+            self._sent = min(self._sent+step, self._received)
+            end = self._sent * 1000 // BYTES_PER_SECOND
+            self._reply('SentenceEnd', index=0, begin_time=begin, time=end, result=f'{begin}-{end}')
+
+
+class HttpHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args: t.Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self._dispatch()
+
+    def do_POST(self) -> None:
+        self._dispatch()
+
+    def do_PUT(self) -> None:
+        self._dispatch()
+
+    def do_HEAD(self) -> None:
+        self._dispatch()
+
+    def do_DELETE(self) -> None:
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        url = up.urlsplit(self.path)
+        query = dict(up.parse_qsl(url.query, keep_blank_values=True))
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+            query.update(up.parse_qsl(body.decode()))
+        time.sleep(self.server.options.latency)
+        if 'Action' in query:
+            self._rpc(query)
+        else:
+            self._oss(url.path, query, body)
+
+    def _respond(self, status: int, body: bytes = b'', **headers: str) -> None:
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key.replace('_', '-'), value)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('x-oss-request-id', uuid.uuid4().hex)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _json(self, data: t.Dict[str, t.Any]) -> None:
+        self._respond(200, json.dumps(data).encode(), Content_Type='application/json')
+
+    def _rpc(self, query: t.Dict[str, str]) -> None:
+        action, tasks = query['Action'], self.server.tasks
+        if action == 'CreateToken':
+            self._json({'Token': {'Id': uuid.uuid4().hex, 'ExpireTime': int(time.time())+86400}})
+        elif action == 'SubmitTask':
+            if random.random() < self.server.options.error_rate:
+                return self._json({'StatusText': 'REQUEST_INVALID_FILE_URL_VALUE'})
+            task_id = uuid.uuid4().hex
+            tasks[task_id] = 0
+            self._json({'StatusText': 'SUCCESS', 'TaskId': task_id})
+        elif action == 'GetTaskResult':
+            task_id = query['TaskId']
+            tasks[task_id] = tasks.get(task_id, 0) + 1
+            if tasks[task_id] <= self.server.options.polls:
+                return self._json({'StatusText': 'RUNNING', 'TaskId': task_id})
+            sentences = [
+                {'ChannelId': 0, 'BeginTime': ith*5000, 'EndTime': ith*5000+4000, 'Text': f'sentence {ith}'}
+                for ith in range(10)
+            ]
+            self._json({'StatusText': 'SUCCESS', 'TaskId': task_id, 'Result': {'Sentences': sentences}})
+        else:
+            self._respond(404)
+
+    def _oss(self, path: str, query: t.Dict[str, str], body: bytes) -> None:
+        objects = self.server.objects
+        headers = {
+            'ETag': '"D41D8CD98F00B204E9800998ECF8427E"',
+            'Last_Modified': self.date_time_string(),
+        }
+        if self.command == 'POST' and 'delete' in query:
+            root = et.fromstring(body)
+            deleted = ''.join(
+                f'<Deleted><Key>{node.text}</Key></Deleted>'
+                for node in root.iter('Key') if objects.pop(node.text, None) is not None
+            )
+            return self._respond(200, f'<DeleteResult>{deleted}</DeleteResult>'.encode())
+        key = path.split('/', 2)[-1]
+        if self.command == 'PUT':
+            objects[key] = len(body)
+            self._respond(200, **headers)
+        elif self.command in ('HEAD', 'GET'):
+            if key not in objects:
+                return self._respond(404)
+            self._respond(200, bytes(objects[key]), **headers)
+        elif self.command == 'DELETE':
+            objects.pop(key, None)
+            self._respond(204)
+        else:
+            self._respond(405)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    for field, default in Options._field_defaults.items():
+        parser.add_argument(f'--{field.replace("_", "-")}', type=type(default), default=default)
+    serve(Options(**vars(parser.parse_args())))
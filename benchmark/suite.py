@@ -0,0 +1,266 @@
+'''End-to-end benchmark of the clients against local stand-ins, no network needed
+
+    python -m benchmark.suite [--number N] [--concurrency C] [--latency S]
+                              [--frame-size N] [--frames N] [--error-rate P] [--only a,b]
+
+Every scenario talks to the servers of `benchmark.mock`, which run in a child
+process. `single` runs one request after another, `batch` goes through the
+batch api of the library and `concurrent` runs `concurrency` requests at a
+time. Reported are requests per second, p50/p99 latency in milliseconds (of
+the whole request, e.g. until the last audio frame), failed requests, and
+the peak thread count and resident memory of this process while the
+scenario runs.
+'''
+import argparse
+import asyncio
+import concurrent.futures as cf
+import contextlib
+import io
+import os
+import pathlib as p
+import tempfile
+import threading
+import time
+import typing as t
+
+from lib.asr import ASR
+from lib.nls import NLS
+from lib.oss import OSS
+from lib.third_party import nls
+
+from .mock import Mock, Options
+
+
+AUTH = {'access_key_id': 'akid', 'access_key_secret': 'secret'}
+TEXT = '床前明月光，疑是地上霜。举头望明月，低头思故乡。'
+
+
+class Monitor:
+    '''Sample thread count and RSS of this process in the background'''
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.threads = 0
+        self.rss = 0
+
+    def __enter__(self) -> 'Monitor':
+        self._thread.start()
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        page = os.sysconf('SC_PAGE_SIZE')
+        while True:
+            # 不计采样线程本身
+            self.threads = max(self.threads, threading.active_count()-1)
+            with open('/proc/self/statm') as f:
+                self.rss = max(self.rss, int(f.read().split()[1])*page)
+            if self._stop.wait(self._interval):
+                break
+
+
+class Report(t.NamedTuple):
+    name: str
+    number: int
+    seconds: float
+    latencies: t.List[float]
+    errors: int
+    threads: int
+    rss: int
+
+    HEADER = f'{"scenario":<24}{"n":>6}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"err":>6}{"threads":>9}{"rss MiB":>9}'
+
+    def __str__(self) -> str:
+        p50, p99 = (
+            (f'{percentile(self.latencies, q)*1000:>10.1f}' for q in (0.5, 0.99))
+            if self.latencies else (f'{"-":>10}', f'{"-":>10}')
+        )
+        return (
+            f'{self.name:<24}{self.number:>6}{self.number/self.seconds:>10.1f}{p50}{p99}'
+            f'{self.errors:>6}{self.threads:>9}{self.rss/1024**2:>9.1f}'
+        )
+
+
+def percentile(values: t.Sequence[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q*len(values)), len(values)-1)]
+
+
+def timed(function: t.Callable[[], t.Any]) -> t.Tuple[float, bool]:
+    start = time.perf_counter()
+    try:
+        ok = function() not in (None, False)
+    except Exception:
+        ok = False
+    return time.perf_counter()-start, ok
+
+
+async def timed_async(coroutine: t.Awaitable[t.Any]) -> t.Tuple[float, bool]:
+    start = time.perf_counter()
+    try:
+        ok = await coroutine not in (None, False)
+    except Exception:
+        ok = False
+    return time.perf_counter()-start, ok
+
+
+class Suite:
+    def __init__(self, mock: Mock, root: p.Path, number: int, concurrency: int) -> None:
+        self._mock = mock
+        self._root = root
+        self._number = number
+        self._concurrency = concurrency
+        nls.setTokenUrl(mock.http_url)
+        NLS.register(**AUTH, app_key='appkey', url=mock.ws_url)
+        ASR.register(**AUTH, app_key='appkey', domain=mock.http_url)
+        OSS.register(**AUTH, endpoint=mock.http_url, bucket_name='bench', bucket_domain='127.0.0.1')
+        self.scenarios = {
+            'token.single': self.token_single,
+            'tts.single': lambda: self.tts_single(keep_alive=False),
+            'tts.single.keep_alive': lambda: self.tts_single(keep_alive=True),
+            'tts.batch': self.tts_batch,
+            'tts.concurrent': self.tts_concurrent,
+            'transcribe.concurrent': self.transcribe_concurrent,
+            'oss.single': self.oss_single,
+            'oss.batch': self.oss_batch,
+            'filetrans.single': self.filetrans_single,
+            'filetrans.concurrent': self.filetrans_concurrent,
+        }
+
+    def run(self, name: str) -> Report:
+        with Monitor() as monitor, contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            results = self.scenarios[name]()
+            seconds = time.perf_counter() - start
+        latencies = [latency for latency, _ in results if latency is not None]
+        errors = sum(not ok for _, ok in results)
+        return Report(name, len(results), seconds, latencies, errors, monitor.threads, monitor.rss)
+
+    def token_single(self) -> t.List[t.Tuple[float, bool]]:
+        provider = nls.TokenProvider(AUTH['access_key_id'], AUTH['access_key_secret'], url=self._mock.http_url)
+        try:
+            return [timed(provider.refresh) for _ in range(self._number)]
+        finally:
+            provider.close()
+
+    def tts_single(self, keep_alive: bool) -> t.List[t.Tuple[float, bool]]:
+        tts = NLS(format='pcm', verbose=False, keep_alive=keep_alive)
+        path = self._root / 'single.pcm'
+        try:
+            return [timed(lambda: tts.tts(TEXT, path)) for _ in range(self._number)]
+        finally:
+            tts.close()
+
+    def tts_batch(self) -> t.List[t.Tuple[t.Optional[float], bool]]:
+        '''`tts_many` does not expose per item timing, so latency is not reported'''
+        tts = NLS(format='pcm', verbose=False, keep_alive=True)
+        items = [(TEXT, self._root/f'batch-{ith}.pcm') for ith in range(self._number)]
+        try:
+            results = tts.tts_many(items, workers=self._concurrency, retries=0)
+        finally:
+            tts.close()
+        return [(None, result.ok) for result in results]
+
+    def tts_concurrent(self) -> t.List[t.Tuple[float, bool]]:
+        async def session(count: int) -> t.List[t.Tuple[float, bool]]:
+            async def synthesize() -> int:
+                if not await synthesizer.start(TEXT):
+                    return None
+                return sum([len(data) async for data in synthesizer])
+
+            async with nls.AsyncNlsSpeechSynthesizer(**self._nls_config()) as synthesizer:
+                return [await timed_async(synthesize()) for _ in range(count)]
+
+        return self._sessions(session)
+
+    def transcribe_concurrent(self, seconds: int = 10, chunk: int = 3200) -> t.List[t.Tuple[float, bool]]:
+        '''Each request streams `seconds` of silence unpaced and waits for all sentences'''
+        audio = bytes(chunk)
+
+        async def session(count: int) -> t.List[t.Tuple[float, bool]]:
+            async def transcribe() -> bool:
+                transcriber = nls.AsyncNlsSpeechTranscriber(**self._nls_config(), keep_alive=False)
+                async with transcriber:
+                    if not await transcriber.start():
+                        return False
+                    for _ in range(seconds*32000//chunk):
+                        if not await transcriber.send_audio(audio):
+                            return False
+                    return await transcriber.stop()
+
+            return [await timed_async(transcribe()) for _ in range(count)]
+
+        return self._sessions(session)
+
+    def oss_single(self) -> t.List[t.Tuple[float, bool]]:
+        return [timed(lambda: oss.upload().delete()) for oss in self._objects('single')]
+
+    def oss_batch(self) -> t.List[t.Tuple[t.Optional[float], bool]]:
+        '''Upload concurrently, then delete with `delete_many`'''
+        objects = self._objects('batch')
+        with cf.ThreadPoolExecutor(self._concurrency) as executor:
+            results = list(executor.map(lambda oss: timed(oss.upload), objects))
+        deleted = set(OSS.delete_many(oss.name for oss in objects))
+        return [(latency, ok and oss.name in deleted) for (latency, ok), oss in zip(results, objects)]
+
+    def filetrans_single(self) -> t.List[t.Tuple[float, bool]]:
+        return [timed(self._filetrans) for _ in range(self._number)]
+
+    def filetrans_concurrent(self) -> t.List[t.Tuple[float, bool]]:
+        with cf.ThreadPoolExecutor(self._concurrency) as executor:
+            return list(executor.map(lambda _: timed(self._filetrans), range(self._number)))
+
+    def _filetrans(self) -> t.Optional[ASR]:
+        asr = ASR('https://127.0.0.1/bench.wav').upload()
+        return asr and asr.polling(delay=0)
+
+    def _nls_config(self) -> t.Dict[str, str]:
+        return {
+            'url': self._mock.ws_url, 'akid': AUTH['access_key_id'],
+            'aksecret': AUTH['access_key_secret'], 'appkey': 'appkey',
+        }
+
+    def _sessions(
+        self, session: t.Callable[[int], t.Awaitable[t.List[t.Tuple[float, bool]]]],
+    ) -> t.List[t.Tuple[float, bool]]:
+        '''Split `number` requests over `concurrency` concurrent sessions'''
+        counts = [
+            self._number//self._concurrency + (ith < self._number%self._concurrency)
+            for ith in range(self._concurrency)
+        ]
+
+        async def main() -> t.List[t.List[t.Tuple[float, bool]]]:
+            return await asyncio.gather(*(session(count) for count in counts if count))
+
+        return [result for results in asyncio.run(main()) for result in results]
+
+    def _objects(self, prefix: str, size: int = 64*1024) -> t.List[OSS]:
+        objects = []
+        for ith in range(self._number):
+            path = self._root / f'{prefix}-{ith}.wav'
+            path.write_bytes(os.urandom(size))
+            objects.append(OSS(path))
+        return objects
+
+
+def main(number: int, concurrency: int, only: t.Optional[t.Sequence[str]], **kwargs: t.Any) -> None:
+    with Mock(**kwargs) as mock, tempfile.TemporaryDirectory() as root:
+        suite = Suite(mock, p.Path(root), number, concurrency)
+        print(Report.HEADER)
+        for name in only or suite.scenarios:
+            print(suite.run(name), flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--only', type=lambda only: only.split(','))
+    for field, default in Options._field_defaults.items():
+        parser.add_argument(f'--{field.replace("_", "-")}', type=type(default), default=default)
+    main(**vars(parser.parse_args()))
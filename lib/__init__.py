@@ -1,6 +1,10 @@
-__all__ = ['ASR', 'NLS', 'OSS']
+__all__ = ['ASR', 'Cache', 'FileTrans', 'Journal', 'NLS', 'OSS', 'Transcriber']
 
 
 from .asr import ASR
+from .cache import Cache
+from .filetrans import FileTrans
+from .journal import Journal
 from .nls import NLS
 from .oss import OSS
+from .transcriber import Transcriber
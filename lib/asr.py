@@ -19,26 +19,37 @@ class ASR:
 
     _client = None
     _appkey = None
+    _domain = 'filetrans.cn-shanghai.aliyuncs.com'
 
     @classmethod
-    def register(cls, access_key_id: str, access_key_secret: str, app_key: str) -> type:
+    def register(
+        cls, access_key_id: str, access_key_secret: str, app_key: str,
+        domain: str = 'filetrans.cn-shanghai.aliyuncs.com',
+    ) -> type:
         cls._client = AcsClient(
             access_key_id, access_key_secret, 'cn-shanghai',
         )
         cls._appkey = app_key
+        cls._domain = domain
         return cls
 
     @classmethod
     def from_backup(cls, path: Path) -> Self:
         data = json.loads(p.Path(path).read_text())
-        self = cls(data['url'])
-        self._data = data['data']
+        return cls.from_data(data['url'], data['data'], data.get('task_id'))
+
+    @classmethod
+    def from_data(cls, url: str, data: t.Dict[str, t.Any], task_id: t.Optional[str] = None) -> Self:
+        '''Result got elsewhere, e.g. from `Transcriber`'''
+        self = cls(url, task_id)
+        self._data = data
         return self
 
-    def __init__(self, url: str) -> None:
+    def __init__(self, url: str, task_id: t.Optional[str] = None) -> None:
+        '''`task_id` of a submitted task resumes polling without submitting again'''
         self._url = url
         self._data = None
-        self._task_id = None
+        self._task_id = task_id
 
     @property
     def data(self) -> t.Optional[t.Dict[str, t.Any]]:
@@ -48,6 +59,10 @@ class ASR:
     def task_id(self) -> t.Optional[str]:
         return self._task_id
 
+    @property
+    def url(self) -> str:
+        return self._url
+
     def upload(self) -> Self:
         request = self._request(post=True)
         task = {
@@ -65,19 +80,24 @@ class ASR:
             print(e)
 
     def polling(self, delay: int = 10) -> Self:
+        while not self.poll():
+            time.sleep(delay)
+        return self
+
+    def poll(self) -> bool:
+        '''Query the task once, return whether it has finished'''
         assert self._task_id is not None
         request = self._request(post=False)
         request.add_query_param('TaskId', self._task_id)
         # 提交录音文件识别结果查询请求
-        while True:
-            try:
-                response = json.loads(self._client.do_action_with_exception(request))
-                if response['StatusText'] not in ('RUNNING', 'QUEUEING'):
-                    self._data = response
-                    return self
-                time.sleep(delay)
-            except (ServerException, ClientException) as e:
-                print(e)
+        try:
+            response = json.loads(self._client.do_action_with_exception(request))
+            if response['StatusText'] not in ('RUNNING', 'QUEUEING'):
+                self._data = response
+                return True
+        except (ServerException, ClientException) as e:
+            print(e)
+        return False
 
     def to(self, *paths: Path, channel_id: int = 0) -> Self:
         mapper = {
@@ -90,7 +110,7 @@ class ASR:
         return self
 
     def to_srt(self, path: Path, channel_id: int = 0) -> Self:
-        data = filter(lambda x: x['ChannelId']==channel_id, self._data['Result']['Sentences'])
+        data = filter(lambda x: x['ChannelId']==channel_id, self._sentences())
         pattern = '{h:02}:{m:02}:{s:02},{ms:03}'
         with open(self._path(path), 'w') as f:
             for ith, item in enumerate(sorted(data, key=lambda x: x['BeginTime'])):
@@ -102,7 +122,7 @@ class ASR:
         self._path(path).write_text(
             '\n'.join(
                 sentence['Text']
-                for sentence in self._data['Result']['Sentences']
+                for sentence in self._sentences()
                 if sentence['ChannelId'] == channel_id
             )
         )
@@ -112,14 +132,19 @@ class ASR:
         self._path(path).write_text(
             json.dumps({
                 'url': self._url,
+                'task_id': self._task_id,
                 'data': self._data,
             }, ensure_ascii=False)
         )
         return self
 
+    def _sentences(self) -> t.List[t.Dict[str, t.Any]]:
+        # SUCCESS_WITH_NO_VALID_FRAGMENT (如静音文件) 没有 Result
+        return self._data.get('Result', {}).get('Sentences', [])
+
     def _request(self, post: bool = True) -> CommonRequest:
         request = CommonRequest()
-        request.set_domain('filetrans.cn-shanghai.aliyuncs.com')
+        request.set_domain(self._domain)
         request.set_version('2018-08-17')
         request.set_product('nls-filetrans')
         request.set_action_name('SubmitTask' if post else 'GetTaskResult')
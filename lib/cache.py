@@ -0,0 +1,145 @@
+__all__ = ['Cache']
+
+
+import hashlib
+import json
+import os
+import pathlib as p
+import shutil
+import sqlite3
+import threading
+import time
+import typing as t
+import uuid
+
+
+Path = t.Union[str, p.Path]
+
+
+class Cache:
+    '''Content addressed file cache with a size bounded LRU policy
+
+    Files live in `root/objects/<key[:2]>/<key>`, sizes and access times in
+    the SQLite index `root/index.sqlite3`, which is shared by threads and
+    processes. Files are written to a temporary name and moved into place
+    with `os.replace`, so readers never see partial files. Hits are copied to
+    the destination, or hard linked when `link=True` and the file system
+    allows it. A link shares the cached file, so cached files are read-only
+    and the destination must be unlinked, not written in place.
+    '''
+
+    Self = __qualname__
+
+    def __init__(self, root: Path, max_size: int = 1024**3, link: bool = False) -> None:
+        self._root = p.Path(root)
+        self._objects = self._root / 'objects'
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._max_size = max_size
+        self._link = link
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hits = self._misses = 0
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entry ('
+            'key TEXT PRIMARY KEY, size INTEGER NOT NULL, atime REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS entry_atime ON entry (atime)')
+
+    @staticmethod
+    def key(*args: t.Any, **kwargs: t.Any) -> str:
+        '''Hash of json serializable arguments, order of `kwargs` does not matter'''
+        data = json.dumps([args, kwargs], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    @property
+    def stats(self) -> t.Dict[str, int]:
+        count, size = self._db.execute('SELECT COUNT(*), TOTAL(size) FROM entry').fetchone()
+        return {
+            'hits': self._hits, 'misses': self._misses,
+            'entries': count, 'size': int(size), 'max_size': self._max_size,
+        }
+
+    def get(self, key: str, dst: Path) -> bool:
+        '''Materialize the cached file at `dst`, return whether it was a hit'''
+        path = self._path(key)
+        row = self._db.execute('SELECT size FROM entry WHERE key=?', (key, )).fetchone()
+        try:
+            if row is None or path.stat().st_size != row[0]:
+                raise FileNotFoundError(path)
+            self._place(path, p.Path(dst), self._link)
+        except FileNotFoundError:
+            # 索引与文件不一致 (被淘汰或被外部修改), 当作未命中
+            if row is not None:
+                self._remove(key)
+            with self._lock:
+                self._misses += 1
+            return False
+        self._db.execute('UPDATE entry SET atime=? WHERE key=?', (time.time(), key))
+        with self._lock:
+            self._hits += 1
+        return True
+
+    def put(self, key: str, src: Path) -> Self:
+        '''Store a copy of `src`, then evict least recently used files beyond `max_size`'''
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        self._place(p.Path(src), path, False)
+        # 硬链接出去的文件与缓存共用 inode, 只读以免被原地写坏
+        path.chmod(0o444)
+        self._db.execute(
+            'INSERT OR REPLACE INTO entry (key, size, atime) VALUES (?, ?, ?)',
+            (key, path.stat().st_size, time.time()),
+        )
+        return self.evict()
+
+    def evict(self, max_size: t.Optional[int] = None) -> Self:
+        max_size = self._max_size if max_size is None else max_size
+        total = self._db.execute('SELECT TOTAL(size) FROM entry').fetchone()[0]
+        if total <= max_size:
+            return self
+        for key, size in self._db.execute('SELECT key, size FROM entry ORDER BY atime').fetchall():
+            self._remove(key)
+            total -= size
+            if total <= max_size:
+                break
+        return self
+
+    def clear(self) -> Self:
+        return self.evict(0)
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        '''One connection per thread, in autocommit mode'''
+        if not hasattr(self._local, 'db'):
+            self._local.db = sqlite3.connect(
+                self._root/'index.sqlite3', timeout=30, isolation_level=None,
+            )
+        return self._local.db
+
+    def _path(self, key: str) -> p.Path:
+        return self._objects / key[:2] / key
+
+    def _place(self, src: p.Path, dst: p.Path, link: bool) -> None:
+        '''Hard link or copy `src` to `dst` atomically'''
+        tmp = dst.parent / f'.{dst.name}.{uuid.uuid4().hex}.tmp'
+        try:
+            if link:
+                try:
+                    os.link(src, tmp)
+                except FileNotFoundError:
+                    raise
+                except OSError:
+                    # 跨文件系统等情况无法硬链接
+                    link = False
+            if not link:
+                shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def _remove(self, key: str) -> None:
+        self._db.execute('DELETE FROM entry WHERE key=?', (key, ))
+        self._path(key).unlink(missing_ok=True)
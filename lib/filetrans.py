@@ -0,0 +1,261 @@
+__all__ = ['FileTrans']
+
+
+import collections
+import concurrent.futures as cf
+import heapq
+import itertools
+import pathlib as p
+import queue
+import tempfile
+import threading
+import time
+import typing as t
+
+import ffmpeg
+
+from .asr import ASR
+from .journal import Journal
+from .oss import OSS
+from .util import RateLimiter
+
+
+Path = t.Union[str, p.Path]
+
+CODEC = {'acodec': 'pcm_s16le', 'ac': 1, 'ar': 16000, 'vn': None}
+
+
+def _transcode(src: str, dst: str) -> float:
+    '''转码为 16kHz 单声道 PCM, 返回音频时长 (秒)'''
+    ffmpeg \
+        .input(src) \
+        .output(dst, **CODEC) \
+        .run(quiet=True, overwrite_output=True)
+    return _duration(p.Path(dst).stat().st_size)
+
+
+def _duration(size: int) -> float:
+    return max(size-44, 0) / (16000*2)
+
+
+class FileTrans:
+    '''Transcode, upload, submit and poll many files at once
+
+    Each stage has its own pool: transcoding runs on a process pool, uploading
+    and submitting on a thread pool, and the calling thread polls every
+    outstanding task from a single schedule. A task is polled for the first
+    time after `min_delay + duration*ratio` seconds, and after that every
+    `elapsed*ratio` seconds within `[min_delay, max_delay]`. Sources are
+    hashed on a thread pool as well, and each one is dispatched as soon as
+    its hash is known.
+
+    With `stream=True` the transcoding stage is skipped and ffmpeg output is
+    uploaded straight from its stdout, see `OSS.from_ffmpeg`.
+
+    With a `journal`, every stage is recorded by the content hash of the
+    source. A rerun exports finished jobs from the journal, resumes polling
+    submitted tasks, and deletes objects left behind by interrupted runs.
+    Unfinished jobs whose source is not among `srcs` any more are marked
+    failed and their objects deleted.
+    '''
+
+    Self = __qualname__
+
+    def __init__(
+        self,
+        transcoders: t.Optional[int] = None, uploaders: int = 4, qps: t.Optional[float] = 10,
+        min_delay: float = 5, max_delay: float = 60, ratio: float = 0.25,
+        names: t.Sequence[str] = ('main.srt', 'main.txt', 'main.backup'),
+        stream: bool = False, journal: t.Optional[Journal] = None, verbose: bool = True,
+    ) -> None:
+        self._transcoders = transcoders
+        self._uploaders = uploaders
+        self._limiter = RateLimiter(qps)
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+        self._ratio = ratio
+        self._names = names
+        self._stream = stream
+        self._journal = journal
+        self._verbose = verbose
+        # 对象按内容命名, 内容相同的任务共用一个对象, 最后一个用完的才删除
+        self._uses = collections.Counter()
+        self._lock = threading.Lock()
+        # 上传须等清理完上次遗留的对象, 清理又须知道全部源文件的摘要
+        self._collected = threading.Event()
+
+    def run(self, srcs: t.Iterable[Path]) -> t.Dict[p.Path, bool]:
+        srcs = list(dict.fromkeys(map(p.Path, srcs)))
+        # 内容相同的文件只转写一次, finished 是已在日志中完成的
+        groups, finished = {}, set()
+        results = {}
+        events = queue.Queue()
+        schedule, counter = [], itertools.count()
+        self._collected.clear()
+        # 转码结果写到私有临时目录, 不能与源文件 (如 x.wav) 同名
+        with tempfile.TemporaryDirectory() as tmp, \
+                cf.ThreadPoolExecutor(self._uploaders) as hashers, \
+                cf.ProcessPoolExecutor(self._transcoders) as transcoders, \
+                cf.ThreadPoolExecutor(self._uploaders) as uploaders:
+            try:
+                # 摘要并发计算, 算出一个就开始转码, 不必等全部读完
+                futures = {hashers.submit(OSS.digest, src): src for src in srcs}
+                for future in cf.as_completed(futures):
+                    src = futures[future]
+                    try:
+                        digest = future.result()
+                    except OSError as e:
+                        print(f'{src}: {e!r}')
+                        results[src] = False
+                        continue
+                    if digest in finished:
+                        self._skip(digest, src)
+                        results[src] = True
+                        continue
+                    if digest in groups:
+                        groups[digest].append(src)
+                        continue
+                    job = self._journal and self._journal.get(digest)
+                    if job and job.state == 'done':
+                        finished.add(digest)
+                        self._skip(digest, src)
+                        results[src] = True
+                        continue
+                    groups[digest] = [src]
+                    dst = None if self._stream else p.Path(tmp, f'{digest}.wav')
+                    if job and job.state == 'submitted':
+                        # 上次运行中断, 继续轮询已提交的任务
+                        if self._verbose:
+                            print(f'Resume: {src} ({job.task_id})')
+                        oss = job.oss and self._acquire(OSS.from_name(job.oss))
+                        events.put((digest, None, oss, ASR(job.url, job.task_id), 0.0))
+                    elif self._stream:
+                        uploaders.submit(self._submit, digest, src, None, None, events)
+                    else:
+                        transcoders \
+                            .submit(_transcode, src.as_posix(), dst.as_posix()) \
+                            .add_done_callback(
+                                lambda future, digest=digest, src=src, dst=dst: uploaders.submit(
+                                    self._submit, digest, src, dst, future, events,
+                                )
+                            )
+                if self._journal is not None:
+                    self._collect(exclude=groups.keys() | finished)
+            finally:
+                self._collected.set()
+            # 轮询: 所有任务共用一个按时间排序的队列
+            while len(results) < len(srcs):
+                timeout = max(schedule[0][0]-time.time(), 0) if schedule else None
+                try:
+                    digest, dst, oss, asr, duration = events.get(timeout=timeout)
+                    if asr is None:
+                        results.update(dict.fromkeys(groups[digest], False))
+                        self._cleanup(digest, dst, oss)
+                    else:
+                        now = time.time()
+                        delay = self._min_delay + duration*self._ratio
+                        heapq.heappush(schedule, (now+delay, next(counter), now, digest, dst, oss, asr))
+                    continue
+                except queue.Empty:
+                    pass
+                _, _, start, digest, dst, oss, asr = heapq.heappop(schedule)
+                self._limiter.acquire()
+                if asr.poll():
+                    results.update(self._export(digest, groups[digest], asr))
+                    self._cleanup(digest, dst, oss)
+                else:
+                    now = time.time()
+                    delay = min(max((now-start)*self._ratio, self._min_delay), self._max_delay)
+                    heapq.heappush(schedule, (now+delay, next(counter), start, digest, dst, oss, asr))
+        return results
+
+    def _submit(
+        self,
+        digest: str, src: p.Path, dst: t.Optional[p.Path], future: t.Optional[cf.Future],
+        events: queue.Queue,
+    ) -> None:
+        oss, asr, duration = None, None, 0.0
+        self._collected.wait()
+        try:
+            if future is None:
+                oss = OSS.from_ffmpeg(src, **CODEC)
+            else:
+                duration = future.result()
+                oss = OSS(dst)
+            self._acquire(oss)
+            if self._journal is not None:
+                self._journal.uploaded(digest, src, oss.name)
+            oss.upload()
+            if future is None:
+                duration = _duration(oss.size)
+            if self._verbose:
+                print(f'Path: {src} ({duration:.1f}s)')
+            asr = ASR(oss.url).upload()
+            if self._journal is not None:
+                if asr is None:
+                    self._journal.failed(digest, 'SubmitTask failed')
+                else:
+                    self._journal.submitted(digest, asr)
+        except Exception as e:
+            print(f'{src}: {e!r}')
+            if self._journal is not None:
+                self._journal.failed(digest, repr(e))
+        events.put((digest, dst, oss, asr, duration))
+
+    def _skip(self, digest: str, src: p.Path) -> None:
+        '''Export the result of a job finished in an earlier run'''
+        if not (src.parent/src.stem).exists():
+            self._journal.result(digest).to(*self._outputs(src))
+        if self._verbose:
+            print(f'Skip: {src}')
+
+    def _export(self, digest: str, srcs: t.Sequence[p.Path], asr: ASR) -> t.Dict[p.Path, bool]:
+        # 没有有效语音也算完成, 输出空的字幕与文本, 重跑时不再提交
+        if asr.data.get('StatusText') not in ('SUCCESS', 'SUCCESS_WITH_NO_VALID_FRAGMENT'):
+            print(f'{srcs[0]}: {asr.data}')
+            if self._journal is not None:
+                self._journal.failed(digest, asr.data.get('StatusText'))
+            return dict.fromkeys(srcs, False)
+        for src in srcs:
+            asr.to(*self._outputs(src))
+            if self._verbose:
+                print(f'Done: {src}')
+        if self._journal is not None:
+            self._journal.done(digest, asr)
+        return dict.fromkeys(srcs, True)
+
+    def _outputs(self, src: p.Path) -> t.List[p.Path]:
+        return [src.parent/src.stem/name for name in self._names]
+
+    def _acquire(self, oss: OSS) -> OSS:
+        with self._lock:
+            self._uses[oss.name] += 1
+        return oss
+
+    def _cleanup(self, digest: str, dst: t.Optional[p.Path], oss: t.Optional[OSS]) -> None:
+        if oss is not None:
+            with self._lock:
+                self._uses[oss.name] -= 1
+                if not self._uses[oss.name]:
+                    # 删除也在锁内, 以免其他任务在此期间判断对象已存在而跳过上传
+                    del self._uses[oss.name]
+                    oss.delete()
+            if self._journal is not None:
+                self._journal.released(digest)
+        if dst is not None:
+            dst.unlink(missing_ok=True)
+
+    def _collect(self, exclude: t.Container[str] = ()) -> None:
+        '''Delete OSS objects left behind by interrupted runs in one go'''
+        orphans = self._journal.orphans(exclude)
+        if not orphans:
+            return
+        deleted = set(OSS.delete_many(orphans.values()))
+        for digest, name in orphans.items():
+            if name in deleted:
+                # 源文件已不在本次输入中的已提交任务不再继续
+                if self._journal.get(digest).state == 'submitted':
+                    self._journal.failed(digest, 'source not found, abandoned')
+                self._journal.released(digest)
+        if self._verbose:
+            print(f'Collect: {len(deleted)} object(s)')
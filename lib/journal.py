@@ -0,0 +1,122 @@
+__all__ = ['Journal', 'Job']
+
+
+import pathlib as p
+import sqlite3
+import threading
+import time
+import typing as t
+
+from .asr import ASR
+
+
+Path = t.Union[str, p.Path]
+
+
+class Job(t.NamedTuple):
+    digest: str
+    src: str
+    state: str
+    oss: t.Optional[str]
+    task_id: t.Optional[str]
+    url: t.Optional[str]
+    error: t.Optional[str]
+    updated: float
+
+
+class Journal:
+    '''Durable state of filetrans jobs, keyed by the content hash of the source
+
+    A job goes `uploaded -> submitted -> done`, or to `failed` from any
+    state. `oss` is the name of the uploaded object until it is deleted,
+    results of finished jobs are kept as `ASR.to_backup` files in
+    `root/results`. Everything is in `root/journal.sqlite3`, shared by
+    threads and processes.
+    '''
+
+    Self = __qualname__
+
+    def __init__(self, root: Path) -> None:
+        self._root = p.Path(root)
+        self._results = self._root / 'results'
+        self._results.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS job ('
+            'digest TEXT PRIMARY KEY, src TEXT NOT NULL, state TEXT NOT NULL, '
+            'oss TEXT, task_id TEXT, url TEXT, error TEXT, updated REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+
+    def get(self, digest: str) -> t.Optional[Job]:
+        row = self._db.execute(
+            f'SELECT {", ".join(Job._fields)} FROM job WHERE digest=?', (digest, ),
+        ).fetchone()
+        return None if row is None else Job(*row)
+
+    def jobs(self, state: t.Optional[str] = None) -> t.List[Job]:
+        sql = f'SELECT {", ".join(Job._fields)} FROM job'
+        if state is None:
+            return [Job(*row) for row in self._db.execute(sql)]
+        return [Job(*row) for row in self._db.execute(f'{sql} WHERE state=?', (state, ))]
+
+    def uploaded(self, digest: str, src: Path, oss: str) -> Self:
+        self._db.execute(
+            'INSERT OR REPLACE INTO job (digest, src, state, oss, updated) VALUES (?, ?, ?, ?, ?)',
+            (digest, str(src), 'uploaded', oss, time.time()),
+        )
+        return self
+
+    def submitted(self, digest: str, asr: ASR) -> Self:
+        return self._update(digest, state='submitted', task_id=asr.task_id, url=asr.url)
+
+    def done(self, digest: str, asr: ASR) -> Self:
+        asr.to_backup(self._result(digest))
+        return self._update(digest, state='done', error=None)
+
+    def failed(self, digest: str, error: t.Any) -> Self:
+        return self._update(digest, state='failed', error=str(error))
+
+    def released(self, digest: str) -> Self:
+        '''The OSS object is deleted'''
+        return self._update(digest, oss=None)
+
+    def result(self, digest: str) -> ASR:
+        return ASR.from_backup(self._result(digest))
+
+    def orphans(self, exclude: t.Container[str] = ()) -> t.Dict[str, str]:
+        '''OSS objects no job is going to use, `{digest: name}`
+
+        Objects of finished jobs, and of unfinished jobs unless their digest
+        is in `exclude`, i.e. the source is no longer around to resume them.
+        Names shared with a job that is kept are left alone.
+        '''
+        rows = self._db.execute('SELECT digest, state, oss FROM job WHERE oss IS NOT NULL').fetchall()
+        unfinished = ('uploaded', 'submitted')
+        kept = {oss for digest, state, oss in rows if state in unfinished and digest in exclude}
+        return {
+            digest: oss
+            for digest, state, oss in rows
+            if oss not in kept and (state not in unfinished or digest not in exclude)
+        }
+
+    def _update(self, digest: str, **kwargs: t.Any) -> Self:
+        columns = ', '.join(f'{key}=?' for key in kwargs)
+        self._db.execute(
+            f'UPDATE job SET {columns}, updated=? WHERE digest=?',
+            (*kwargs.values(), time.time(), digest),
+        )
+        return self
+
+    def _result(self, digest: str) -> p.Path:
+        return self._results / f'{digest}.backup'
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        '''One connection per thread, in autocommit mode'''
+        if not hasattr(self._local, 'db'):
+            self._local.db = sqlite3.connect(
+                self._root/'journal.sqlite3', timeout=30, isolation_level=None,
+            )
+        return self._local.db
@@ -1,10 +1,72 @@
-__all__ = ['NLS']
+__all__ = ['NLS', 'Result']
 
 
+import concurrent.futures as cf
+import contextlib
 import pathlib as p
+import re
+import struct
+import threading
+import time
 import typing as t
 
+from .cache import Cache
 from .third_party import nls
+from .util import RateLimiter
+
+
+Path = t.Union[str, p.Path]
+
+
+class Result(t.NamedTuple):
+    text: str
+    path: p.Path
+    ok: bool
+    attempts: int
+    error: t.Optional[t.Any] = None
+
+
+class _Segment:
+    '''Audio of one segment, written by a synthesis thread and read by `NLS.stream`'''
+
+    def __init__(self) -> None:
+        self._chunks = []
+        self._taken = 0
+        self._done = False
+        self._error = None
+        self._cond = threading.Condition()
+
+    def write(self, data: bytes) -> None:
+        with self._cond:
+            self._chunks.append(data)
+            self._cond.notify()
+
+    def reset(self) -> bool:
+        '''Drop data of a failed attempt, impossible once some was read'''
+        with self._cond:
+            if self._taken:
+                return False
+            self._chunks.clear()
+            return True
+
+    def finish(self, error: t.Optional[t.Any] = None) -> None:
+        with self._cond:
+            self._done, self._error = True, error
+            self._cond.notify()
+
+    def __iter__(self) -> t.Iterator[bytes]:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._taken < len(self._chunks) or self._done)
+                if self._taken < len(self._chunks):
+                    data = self._chunks[self._taken]
+                    self._chunks[self._taken] = None
+                    self._taken += 1
+                elif self._error is not None:
+                    raise RuntimeError(self._error)
+                else:
+                    return
+            yield data
 
 
 class NLS:
@@ -13,20 +75,35 @@ class NLS:
     _config = None
 
     @classmethod
-    def register(cls, access_key_id: str, access_key_secret: str, app_key: str) -> type:
+    def register(
+        cls, access_key_id: str, access_key_secret: str, app_key: str,
+        url: t.Optional[str] = None, token_url: t.Optional[str] = None,
+    ) -> type:
+        '''`url` of the websocket gateway and `token_url` of CreateToken, default to cn-shanghai'''
         cls._config = {
             'akid': access_key_id,
             'aksecret': access_key_secret,
             'appkey': app_key,
         }
+        if url is not None:
+            cls._config['url'] = url
+        if token_url is not None:
+            nls.setTokenUrl(token_url)
         return cls
 
     def __init__(
         self,
         format: str = 'mp3', speaker: str = 'andy', volume: int = 50,
         sample_rate: int = 16000, speech_rate: int = 0, pitch_rate: int = 0,
-        verbose: bool = True,
+        verbose: bool = True, keep_alive: bool = False, idle_timeout: int = 30,
+        cache: t.Optional[Cache] = None,
     ) -> None:
+        self._options = {
+            'format': format, 'speaker': speaker, 'volume': volume,
+            'sample_rate': sample_rate, 'speech_rate': speech_rate, 'pitch_rate': pitch_rate,
+            'verbose': verbose, 'keep_alive': keep_alive, 'idle_timeout': idle_timeout,
+            'cache': cache,
+        }
         self._default = {
             'aformat': format,
             'voice': speaker,
@@ -41,18 +118,190 @@ class NLS:
             on_completed=self._on_completed,
             on_error=self._on_error,
             on_close=self._on_close,
+            keep_alive=keep_alive,
+            idle_timeout=idle_timeout,
             **self._config,
         )
         self._verbose = verbose
+        self._cache = cache
         self._file = None
+        self._error = None
+
+    @staticmethod
+    def split(text: str, limit: int = 300) -> t.List[str]:
+        '''Split at sentence, then clause boundaries into segments of at most `limit` characters'''
+        segments = []
+        # 英文句号后须有空白或结尾, 以免切开 3.14, e.g. 之类
+        sentences = re.findall(r'(?:[^。！？!?；;\n.]|\.(?!\s|$))+(?:[。！？!?；;\n]|\.(?=\s|$))*', text)
+        for sentence in sentences:
+            if len(sentence) > limit:
+                clauses = re.findall(r'[^，,、：:]+[，,、：:]*', sentence)
+                pieces = [piece for clause in clauses for piece in _wrap(clause, limit)]
+            else:
+                pieces = [sentence]
+            for piece in pieces:
+                if segments and len(segments[-1])+len(piece) <= limit:
+                    segments[-1] += piece
+                else:
+                    segments.append(piece)
+        return [segment for segment in map(str.strip, segments) if segment]
+
+    def tts(self, text: str, path: Path, **kwargs) -> bool:
+        '''Synthesize `text` into `path`, served from the cache if one is given'''
+        if self._cache is None:
+            with open(path, 'wb') as f:
+                return self._synthesize(text, f, **kwargs)
+        # 只有影响音频的参数参与缓存键, 超时等选项不应导致未命中
+        options = {**self._default, **kwargs}
+        key = self._cache.key(text, **{name: options[name] for name in self._default})
+        if self._cache.get(key, path):
+            return True
+        # path 可能是缓存文件的硬链接, 不能原地覆盖
+        p.Path(path).unlink(missing_ok=True)
+        with open(path, 'wb') as f:
+            ok = self._synthesize(text, f, **kwargs)
+        if ok:
+            self._cache.put(key, path)
+        return ok
+
+    def tts_long(self, text: str, path: Path, **kwargs) -> bool:
+        '''Like `tts` but for text of any length, see `stream`'''
+        path = p.Path(path)
+        try:
+            with open(path, 'wb') as f:
+                size = sum(f.write(data) for data in self.stream(text, **kwargs))
+                if self._default['aformat'] == 'wav':
+                    f.seek(0)
+                    sample_rate = kwargs.get('sample_rate', self._default['sample_rate'])
+                    f.write(_wav_header(sample_rate, size-44))
+            return True
+        except RuntimeError as e:
+            if self._verbose:
+                print(f'{path}: {e}')
+            path.unlink(missing_ok=True)
+            return False
+
+    def stream(
+        self, text: str, limit: int = 300, workers: int = 4, qps: t.Optional[float] = None,
+        retries: int = 3, backoff: float = 1.0, **kwargs,
+    ) -> t.Iterator[bytes]:
+        '''Synthesize text of any length, yield audio in order as soon as it arrives
+
+        The text is split by `split`, segments are synthesized concurrently and
+        audio of the first segment is yielded while later ones are still being
+        synthesized. Segments are joined into one stream: wav has a single
+        header (sizes unknown while streaming, see `tts_long`) followed by the
+        pcm of every segment, mp3 has ID3 tags of every segment removed.
 
-    def tts(self, text: str, path: t.Union[str, p.Path], **kwargs) -> bool:
-        self._file = open(path, 'wb')
-        return self._tts.start(text=text, **self._default, **kwargs)
+        Raise RuntimeError if a segment fails after `retries` retries.
+        '''
+        aformat = self._default['aformat']
+        kwargs['aformat'] = 'pcm' if aformat == 'wav' else aformat
+        limiter = RateLimiter(qps)
+        texts = self.split(text, limit)
+        segments = [_Segment() for _ in texts]
+        stop = threading.Event()
+
+        def run(nls: 'NLS', text: str, segment: _Segment) -> None:
+            error = 'cancelled'
+            for attempt in range(retries+1):
+                if stop.is_set():
+                    break
+                if attempt:
+                    time.sleep(backoff * 2**(attempt-1))
+                    if not segment.reset():
+                        break
+                limiter.acquire()
+                try:
+                    if nls._synthesize(text, segment, **kwargs):
+                        segment.finish()
+                        return
+                    error = nls._error or 'timeout'
+                except Exception as e:
+                    # 必须 finish, 否则读取方会一直等待
+                    error = repr(e)
+            segment.finish(error)
+
+        if aformat == 'wav':
+            yield _wav_header(kwargs.get('sample_rate', self._default['sample_rate']))
+        with self._pool(workers) as (executor, clone):
+            futures = [
+                executor.submit(lambda *args: run(clone(), *args), text, segment)
+                for text, segment in zip(texts, segments)
+            ]
+            try:
+                for segment in segments:
+                    yield from (_strip_id3(segment) if aformat == 'mp3' else segment)
+            finally:
+                stop.set()
+                for future in futures:
+                    future.cancel()
+
+    def tts_many(
+        self, items: t.Iterable[t.Tuple[str, Path]],
+        workers: int = 4, qps: t.Optional[float] = None,
+        retries: int = 3, backoff: float = 1.0, **kwargs,
+    ) -> t.List[Result]:
+        '''Synthesize `(text, path)` pairs concurrently
+
+        - workers: 同时进行的合成数, 不应超过账号的并发配额
+        - qps: 每秒最多发起的合成请求数, None 表示不限制
+        - retries: 失败 (on_error 或超时) 后的重试次数, 间隔按 backoff 指数增长
+        '''
+        limiter = RateLimiter(qps)
+
+        def run(text: str, path: Path) -> Result:
+            path, nls = p.Path(path), clone()
+            for attempt in range(retries+1):
+                if attempt:
+                    time.sleep(backoff * 2**(attempt-1))
+                limiter.acquire()
+                try:
+                    if nls.tts(text, path, **kwargs):
+                        return Result(text, path, True, attempt+1)
+                    error = nls._error or 'timeout'
+                except Exception as e:
+                    # 如获取 token 失败, 只影响这一项
+                    error = repr(e)
+            path.unlink(missing_ok=True)
+            return Result(text, path, False, attempt+1, error)
+
+        with self._pool(workers) as (executor, clone):
+            futures = [executor.submit(run, text, path) for text, path in items]
+            return [future.result() for future in futures]
 
     def close(self) -> None:
         self._tts.shutdown()
 
+    @contextlib.contextmanager
+    def _pool(self, workers: int) -> t.Iterator[t.Tuple[cf.Executor, t.Callable[[], 'NLS']]]:
+        '''Thread pool where each thread has its own copy of `self`'''
+        local = threading.local()
+        clones, lock = [], threading.Lock()
+
+        def clone() -> 'NLS':
+            if not hasattr(local, 'nls'):
+                local.nls = NLS(**self._options)
+                with lock:
+                    clones.append(local.nls)
+            return local.nls
+
+        try:
+            with cf.ThreadPoolExecutor(max_workers=workers) as executor:
+                yield executor, clone
+        finally:
+            for nls in clones:
+                nls.close()
+
+    def _synthesize(self, text: str, file: t.Any, **kwargs) -> bool:
+        '''Synthesize into `file`, anything with a `write` method'''
+        self._file = file
+        self._error = None
+        try:
+            return self._tts.start(text=text, **{**self._default, **kwargs})
+        finally:
+            self._file = None
+
     def _on_metainfo(self, message: t.Dict[str, t.Any], *args: t.Any) -> None:
         if self._verbose:
             print(f'on_metainfo: message={message}, *args={args}')
@@ -60,7 +309,8 @@ class NLS:
     def _on_data(self, data: bytes, *args: t.Any) -> None:
         if self._verbose:
             print(f'on_data: data=..., *args={args}')
-        self._file.write(data)
+        if self._file is not None:
+            self._file.write(data)
 
     def _on_completed(self, message: t.Dict[str, t.Any], *args: t.Any) -> None:
         if self._verbose:
@@ -69,8 +319,53 @@ class NLS:
     def _on_error(self, message: t.Dict[str, t.Any], *args: t.Any) -> None:
         if self._verbose:
             print(f'on_error: message={message}, *args={args}')
+        self._error = message
 
     def _on_close(self, *args: t.Any) -> None:
         if self._verbose:
             print(f'on_close: *args={args}')
-        self._file.close()
+
+
+
+def _wrap(text: str, limit: int) -> t.List[str]:
+    '''Cut `text` into pieces of at most `limit` characters, at whitespace where possible'''
+    pieces = []
+    while len(text) > limit:
+        spaces = [m.start() for m in re.finditer(r'\s', text[1:limit+1])]
+        cut = spaces[-1]+1 if spaces else limit
+        pieces.append(text[:cut])
+        text = text[cut:]
+    pieces.append(text)
+    return pieces
+
+
+def _wav_header(sample_rate: int, size: int = 0xFFFFFFFF) -> bytes:
+    '''16 bit mono, `size` is the length of pcm data, unknown by default'''
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', min(size+36, 0xFFFFFFFF), b'WAVE', b'fmt ', 16, 1, 1,
+        sample_rate, sample_rate*2, 2, 16, b'data', size,
+    )
+
+
+def _strip_id3(chunks: t.Iterable[bytes]) -> t.Iterator[bytes]:
+    '''Remove ID3v2 tag at the beginning and ID3v1 tag at the end of mp3'''
+    buffer, head = b'', True
+    for chunk in chunks:
+        buffer += chunk
+        if head:
+            if len(buffer) < 10:
+                continue
+            if buffer[:3] == b'ID3':
+                # 标签长度为 syncsafe 整数
+                size = 10 + sum(b<<(7*(3-i)) for i, b in enumerate(buffer[6:10]))
+                if len(buffer) < size:
+                    continue
+                buffer = buffer[size:]
+            head = False
+        # 末尾 128 字节可能是 ID3v1, 暂不输出
+        if len(buffer) > 128:
+            yield buffer[:-128]
+            buffer = buffer[-128:]
+    if buffer and not (len(buffer) == 128 and buffer[:3] == b'TAG'):
+        yield buffer
@@ -1,10 +1,15 @@
 __all__ = ['OSS']
 
 
+import concurrent.futures as cf
 import hashlib
+import json
+import os
 import pathlib as p
+import threading
 import typing as t
 
+import ffmpeg
 import oss2
 
 
@@ -16,21 +21,88 @@ class OSS:
 
     _bucket = None
     _domain = None
+    _store = None
+    _multipart_threshold = 64 * 1024**2
+    _part_size = 8 * 1024**2
+    _num_threads = 4
+
+    _digests = {}
+    _lock = threading.Lock()
 
     @classmethod
     def register(
         cls,
         access_key_id: str, access_key_secret: str,
         endpoint: str, bucket_name: str, bucket_domain: str,
+        multipart_threshold: int = 64*1024**2, part_size: int = 8*1024**2, num_threads: int = 4,
+        checkpoint: t.Optional[Path] = None,
     ) -> type:
         auth = oss2.Auth(access_key_id, access_key_secret)
         cls._bucket = oss2.Bucket(auth, endpoint, bucket_name)
         cls._domain = bucket_domain
+        cls._multipart_threshold = multipart_threshold
+        cls._part_size = part_size
+        cls._num_threads = num_threads
+        # 断点续传记录, 默认保存在用户目录下
+        cls._store = oss2.ResumableStore(root=str(checkpoint)) if checkpoint else None
         return cls
 
+    @classmethod
+    def from_ffmpeg(cls, src: Path, suffix: str = '.wav', **kwargs: t.Any) -> Self:
+        '''Upload ffmpeg output of `src` by streaming stdout, no temporary file needed
+
+        The object is named by the content of `src` and the output arguments.
+        '''
+        self = cls.__new__(cls)
+        self._path = p.Path(src).absolute()
+        self._args = {'format': suffix[1:], **kwargs}
+        self._name = self._md5(
+            self.digest(self._path) + json.dumps(self._args, sort_keys=True)
+        ) + suffix
+        self._size = None
+        return self
+
+    @classmethod
+    def from_name(cls, name: str) -> Self:
+        '''Object uploaded before, only `url`, `exists` and `delete` make sense'''
+        self = cls.__new__(cls)
+        self._path = None
+        self._args = None
+        self._name = name
+        self._size = None
+        return self
+
+    @classmethod
+    def delete_many(cls, names: t.Iterable[str]) -> t.List[str]:
+        '''Delete objects in batches, return names of the deleted'''
+        names, deleted = list(names), []
+        # 单次批量删除最多 1000 个对象
+        for ith in range(0, len(names), 1000):
+            result = cls._bucket.batch_delete_objects(names[ith:ith+1000])
+            deleted.extend(result.deleted_keys)
+        return deleted
+
+    @classmethod
+    def digest(cls, path: Path) -> str:
+        '''MD5 of file content, cached by (device, inode, mtime, size)'''
+        stat = os.stat(path)
+        key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with cls._lock:
+            if key in cls._digests:
+                return cls._digests[key]
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024**2), b''):
+                md5.update(chunk)
+        with cls._lock:
+            cls._digests[key] = md5.hexdigest()
+        return cls._digests[key]
+
     def __init__(self, path: Path) -> None:
         self._path = p.Path(path).absolute()
-        self._name = self._md5(str(self._path)) + self._path.suffix
+        self._args = None
+        self._name = self.digest(self._path) + self._path.suffix
+        self._size = self._path.stat().st_size
 
     def __enter__(self) -> Self:
         return self.upload()
@@ -38,17 +110,79 @@ class OSS:
     def __exit__(self, type, value, traceback) -> None:
         self.delete()
 
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def size(self) -> t.Optional[int]:
+        return self._size
+
     @property
     def url(self) -> str:
         return f'https://{self._domain}/{self._name}'
 
+    def exists(self) -> bool:
+        return self._bucket.object_exists(self._name)
+
     def upload(self) -> Self:
-        self._bucket.put_object_from_file(self._name, str(self._path))
+        if self.exists():
+            if self._size is None:
+                self._size = self._bucket.head_object(self._name).content_length
+        elif self._args is None:
+            oss2.resumable_upload(
+                self._bucket, self._name, str(self._path), store=self._store,
+                multipart_threshold=self._multipart_threshold,
+                part_size=self._part_size, num_threads=self._num_threads,
+            )
+        else:
+            process = ffmpeg \
+                .input(self._path.as_posix()) \
+                .output('pipe:', **self._args) \
+                .global_args('-loglevel', 'error') \
+                .run_async(pipe_stdout=True)
+            try:
+                self._size = self._upload_stream(process.stdout)
+            finally:
+                process.stdout.close()
+                if process.wait() and self._size is not None:
+                    self.delete()
+                    raise RuntimeError(f'ffmpeg exited with {process.returncode}: {self._path}')
         return self
 
     def delete(self) -> Self:
         self._bucket.delete_object(self._name)
         return self
 
+    def _upload_stream(self, stream: t.BinaryIO) -> int:
+        data = stream.read(self._part_size)
+        if len(data) < self._part_size:
+            self._bucket.put_object(self._name, data)
+            return len(data)
+        upload_id = self._bucket.init_multipart_upload(self._name).upload_id
+        size, futures = 0, []
+        # 同时在内存中的分片数不超过线程数
+        semaphore = threading.BoundedSemaphore(self._num_threads)
+        try:
+            with cf.ThreadPoolExecutor(self._num_threads) as executor:
+                while data:
+                    semaphore.acquire()
+                    future = executor.submit(
+                        self._bucket.upload_part, self._name, upload_id, len(futures)+1, data,
+                    )
+                    future.add_done_callback(lambda _: semaphore.release())
+                    futures.append(future)
+                    size += len(data)
+                    data = stream.read(self._part_size)
+            parts = [
+                oss2.models.PartInfo(ith+1, future.result().etag)
+                for ith, future in enumerate(futures)
+            ]
+            self._bucket.complete_multipart_upload(self._name, upload_id, parts)
+        except BaseException:
+            self._bucket.abort_multipart_upload(self._name, upload_id)
+            raise
+        return size
+
     def _md5(self, string: str) -> str:
         return hashlib.md5(string.encode()).hexdigest()
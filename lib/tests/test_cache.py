@@ -0,0 +1,53 @@
+import itertools
+import pathlib as p
+import tempfile
+import unittest
+import unittest.mock
+
+from lib.cache import Cache
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = p.Path(self._tmp.name)
+        # 访问时间递增, 不受时钟精度影响
+        patcher = unittest.mock.patch('time.time', side_effect=itertools.count())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def test_evict_least_recently_used(self) -> None:
+        cache = Cache(self.root/'cache', max_size=30)
+        for key in 'abc':
+            cache.put(key, self._file(key, 10))
+        self.assertTrue(cache.get('a', self.root/'out'))
+        cache.put('d', self._file('d', 10))
+        self.assertEqual(
+            [cache.get(key, self.root/'out') for key in 'abcd'], [True, False, True, True],
+        )
+        cache.put('e', self._file('e', 20))
+        # a 与 c 都比 d 新, 按访问先后淘汰
+        self.assertEqual(
+            [cache.get(key, self.root/'out') for key in 'acde'], [False, False, True, True],
+        )
+        self.assertEqual(cache.stats['size'], 30)
+
+    def test_hit_does_not_share_cached_file(self) -> None:
+        cache = Cache(self.root/'cache').put('a', self._file('a', 10))
+        dst = self.root / 'out'
+        self.assertTrue(cache.get('a', dst))
+        dst.write_bytes(b'changed')
+        self.assertTrue(cache.get('a', dst))
+        self.assertEqual(dst.read_bytes(), b'a'*10)
+
+    def _file(self, name: str, size: int) -> p.Path:
+        path = self.root / name
+        path.write_bytes(name.encode()*size)
+        return path
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import tempfile
+import unittest
+
+from lib.asr import ASR
+from lib.journal import Journal
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.journal = Journal(self._tmp.name)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def test_orphans(self) -> None:
+        asr = ASR.from_data('url', {'StatusText': 'SUCCESS'}, 'task')
+        self.journal.uploaded('a', 'a.wav', 'x').submitted('a', asr)
+        self.journal.uploaded('b', 'b.wav', 'x').done('b', asr)
+        self.journal.uploaded('c', 'c.wav', 'y').done('c', asr)
+        self.journal.uploaded('d', 'd.wav', 'z')
+        self.journal.uploaded('e', 'e.wav', 'w').released('e')
+        self.assertEqual(self.journal.orphans(), {'a': 'x', 'b': 'x', 'c': 'y', 'd': 'z'})
+        # b 已完成, 但对象与仍要继续的 a 同名
+        self.assertEqual(self.journal.orphans({'a'}), {'c': 'y', 'd': 'z'})
+        self.assertEqual(self.journal.orphans({'a', 'b', 'd'}), {'c': 'y'})
+
+
+if __name__ == '__main__':
+    unittest.main()
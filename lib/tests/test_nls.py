@@ -0,0 +1,47 @@
+import unittest
+
+from lib.nls import NLS, _strip_id3, _wrap
+
+
+class SplitTest(unittest.TestCase):
+    def test_sentences(self) -> None:
+        self.assertEqual(NLS.split('一。二。三。', 4), ['一。二。', '三。'])
+        self.assertEqual(NLS.split('Pi is 3.14. Next.', 12), ['Pi is 3.14.', 'Next.'])
+        self.assertEqual(NLS.split('e.g. this one. And that.', 15), ['e.g. this one.', 'And that.'])
+
+    def test_clauses(self) -> None:
+        self.assertEqual(NLS.split('甲乙丙，丁戊己，庚辛。', 5), ['甲乙丙，', '丁戊己，', '庚辛。'])
+
+    def test_limit(self) -> None:
+        text = '这是一个没有标点的很长的句子' * 10 + '。' + 'word ' * 100
+        segments = NLS.split(text, 30)
+        self.assertTrue(all(len(segment) <= 30 for segment in segments))
+        self.assertEqual(''.join(segments).replace(' ', ''), text.replace(' ', ''))
+
+    def test_wrap(self) -> None:
+        self.assertEqual(_wrap('aaa bbb ccc', 5), ['aaa', ' bbb', ' ccc'])
+        self.assertEqual(_wrap('abcdefg', 3), ['abc', 'def', 'g'])
+        self.assertEqual(_wrap('abc', 3), ['abc'])
+
+
+class StripId3Test(unittest.TestCase):
+    AUDIO = bytes(range(256)) * 2
+
+    def test_tags(self) -> None:
+        # ID3v2 标签头 10 字节, 长度 200 = 1<<7 | 72, 为 syncsafe 整数
+        v2 = b'ID3\x04\x00\x00\x00\x00\x01\x48' + bytes(200)
+        v1 = b'TAG' + bytes(125)
+        for size in (1, 7, 4096):
+            self.assertEqual(self._strip(v2+self.AUDIO+v1, size), self.AUDIO)
+
+    def test_no_tags(self) -> None:
+        for data in (self.AUDIO, self.AUDIO[:128], b'abc'):
+            self.assertEqual(self._strip(data, 7), data)
+
+    def _strip(self, data: bytes, size: int) -> bytes:
+        chunks = (data[ith:ith+size] for ith in range(0, len(data), size))
+        return b''.join(_strip_id3(chunks))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,10 +17,13 @@ limitations under the License.
 """
 
 from ._logging import *
+from ._metrics import *
 from ._speech_recognizer import *
 from ._speech_transcriber import *
 from ._speech_synthesizer import *
 from ._common_proto import *
+from ._token import *
 from ._util import *
+from ._aio import *
 
 __version__ = "0.0.1"
@@ -0,0 +1,743 @@
+"""
+_aio.py
+
+Asyncio client for speech synthesizer, recognizer and transcriber. All
+connections of a process are driven by one event loop, instead of one
+thread running WebSocketApp.run_forever per connection as NlsCore does.
+"""
+
+import asyncio
+import json
+import ssl
+import struct
+import uuid
+
+from . import _logging
+from . import _metrics
+from . import _token
+from . import _util
+from .websocket import _handshake
+from .websocket._abnf import ABNF, STATUS_NORMAL, continuous_frame
+from .websocket._exceptions import WebSocketException
+from .websocket._url import parse_url
+
+__URL__ = "wss://nls-gateway.cn-shanghai.aliyuncs.com/ws/v1"
+
+__all__ = ["AsyncNlsCore", "AsyncNlsSpeechSynthesizer",
+           "AsyncNlsSpeechRecognizer", "AsyncNlsSpeechTranscriber",
+           "NlsTaskFailed"]
+
+_END = object()
+
+
+class NlsTaskFailed(Exception):
+    """
+    Raised from async iteration when cloud replies TaskFailed, args[0] is
+    the json format message
+    """
+
+
+class AsyncNlsCore:
+    """
+    Websocket connection on asyncio streams
+
+    """
+
+    def __init__(self, url=__URL__, akid=None, aksecret=None, token=None):
+        """
+        AsyncNlsCore initialization
+
+        Parameters:
+        -----------
+        url: str
+            websocket url.
+        akid: str
+            access id from aliyun. if you provide a token, ignore this argument.
+        aksecret: str
+            access secret key from aliyun. if you provide a token, ignore this
+            argument.
+        token: str
+            access token. if you do not have a token, provide access id and key
+            secret from your aliyun account.
+        """
+        self.__url = url
+        self.__token = token
+        self.__token_provider = None
+        if akid and aksecret:
+            self.__token_provider = _token.getTokenProvider(akid, aksecret)
+        elif not token:
+            raise ValueError("akid aksecret and toke are all None")
+        self.__reader = None
+        self.__writer = None
+        self.__ping_task = None
+        self.__cont_frame = continuous_frame(False, False)
+
+    async def connect(self, timeout=10, ping_interval=8):
+        """
+        Open connection and finish websocket handshake
+
+        Parameters:
+        -----------
+        timeout: int
+            timeout for connection setup
+        ping_interval: int
+            send ping interval, 0 for disable ping send, default is 8
+        """
+        __start = _metrics.now()
+        await asyncio.wait_for(self.__connect(), timeout)
+        _metrics.since("nls.connect", __start)
+        if ping_interval:
+            self.__ping_task = asyncio.ensure_future(
+                self.__keepalive(ping_interval))
+
+    async def __connect(self):
+        hostname, port, resource, is_secure = parse_url(self.__url)
+        token = self.__token
+        if self.__token_provider:
+            # CreateToken is a blocking http request, cached most of the time
+            token = await asyncio.get_running_loop().run_in_executor(
+                None, self.__token_provider.get)
+        self.__reader, self.__writer = await asyncio.open_connection(
+            hostname, port,
+            ssl=ssl.create_default_context() if is_secure else None)
+        headers, key = _handshake._get_handshake_headers(
+            resource, hostname, port,
+            {"header": ["X-NLS-Token: {}".format(token)]})
+        self.__writer.write("\r\n".join(headers).encode("utf-8"))
+        response = await self.__reader.readuntil(b"\r\n\r\n")
+        lines = response.decode("utf-8").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        if status != 101:
+            raise WebSocketException(
+                "Handshake status {} {}".format(status, lines[0]))
+        resp_headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                resp_headers[k.lower()] = v.strip()
+        success, _ = _handshake._validate(resp_headers, key, None)
+        if not success:
+            raise WebSocketException("Invalid WebSocket Header")
+        _logging.debug("async connected to %s", self.__url)
+
+    def is_connected(self):
+        return self.__writer is not None
+
+    async def send(self, msg, binary):
+        """
+        Send one message
+
+        Parameters:
+        -----------
+        msg: str or bytes
+            message to send
+        binary: bool
+            send as binary frame, otherwise as text frame
+        """
+        opcode = ABNF.OPCODE_BINARY if binary else ABNF.OPCODE_TEXT
+        _metrics.incr("nls.bytes.sent", len(msg))
+        await self.__send_frame(ABNF.create_frame(msg, opcode))
+
+    async def recv(self):
+        """
+        Receive next text or binary message, ping and pong are handled
+        inside. Return (opcode, data) where data is str for text frame, or
+        None when connection is closed
+        """
+        while True:
+            try:
+                frame = await self.__recv_frame()
+                if frame.opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY,
+                                    ABNF.OPCODE_CONT):
+                    self.__cont_frame.validate(frame)
+                    self.__cont_frame.add(frame)
+                    if not self.__cont_frame.is_fire(frame):
+                        continue
+                    opcode, frame = self.__cont_frame.extract(frame)
+                    _metrics.incr("nls.bytes.received", len(frame.data))
+                    if opcode == ABNF.OPCODE_TEXT:
+                        return opcode, frame.data.decode("utf-8")
+                    return opcode, frame.data
+                elif frame.opcode == ABNF.OPCODE_PING:
+                    await self.__send_frame(
+                        ABNF.create_frame(frame.data, ABNF.OPCODE_PONG))
+                elif frame.opcode == ABNF.OPCODE_CLOSE:
+                    _logging.debug("async connection closed by server")
+                    await self.close()
+                    return None
+            except (asyncio.IncompleteReadError, WebSocketException,
+                    OSError) as e:
+                _logging.debug("async recv failed: %s", e)
+                await self.close()
+                return None
+
+    async def close(self):
+        """
+        Send close frame and close connection
+        """
+        if self.__writer is None:
+            return
+        __writer, self.__writer = self.__writer, None
+        if self.__ping_task:
+            self.__ping_task.cancel()
+            self.__ping_task = None
+        try:
+            __writer.write(ABNF.create_frame(
+                struct.pack("!H", STATUS_NORMAL), ABNF.OPCODE_CLOSE).format())
+            await __writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        __writer.close()
+        try:
+            await __writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+    async def __send_frame(self, frame):
+        if self.__writer is None:
+            raise WebSocketException("connection is already closed")
+        self.__writer.write(frame.format())
+        await self.__writer.drain()
+
+    async def __recv_frame(self):
+        b1, b2 = await self.__reader.readexactly(2)
+        length = b2 & 0x7f
+        if length == 0x7e:
+            length = struct.unpack("!H", await self.__reader.readexactly(2))[0]
+        elif length == 0x7f:
+            length = struct.unpack("!Q", await self.__reader.readexactly(8))[0]
+        mask_key = await self.__reader.readexactly(4) if b2 >> 7 else None
+        data = await self.__reader.readexactly(length)
+        if mask_key:
+            data = ABNF.mask(mask_key, data)
+        frame = ABNF(b1 >> 7 & 1, b1 >> 6 & 1, b1 >> 5 & 1, b1 >> 4 & 1,
+                     b1 & 0x0f, b2 >> 7, data)
+        frame.validate()
+        return frame
+
+    async def __keepalive(self, interval):
+        while self.__writer is not None:
+            await asyncio.sleep(interval)
+            try:
+                await self.__send_frame(
+                    ABNF.create_frame(b"", ABNF.OPCODE_PING))
+            except (WebSocketException, OSError):
+                return
+
+
+class _AsyncNlsTask:
+    """
+    Request/response flow shared by synthesizer, recognizer and transcriber.
+    Messages of current task are read by one coroutine per connection and
+    queued for async iteration.
+    """
+
+    __NAMESPACE__ = None
+    __REQUEST_CMD__ = {}
+    __STARTED__ = None
+    __COMPLETED__ = None
+    __METRIC__ = None
+    __YIELD_MESSAGE__ = True
+
+    def __init__(self, url, akid, aksecret, token, appkey, keep_alive):
+        self.__url = url
+        self.__akid = akid
+        self.__aksecret = aksecret
+        self.__token = token
+        self.__appkey = appkey
+        self.__keep_alive = keep_alive
+        self.__nls = None
+        self.__read_task = None
+        self.__task_id = None
+        self.__task_start = None
+        self.__first_byte = False
+        self.__queue = None
+        self.__started = None
+        self.__completed = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.__queue is None:
+            raise StopAsyncIteration
+        item = await self.__queue.get()
+        if item is _END:
+            # keep iteration finished for later __anext__
+            self.__queue.put_nowait(_END)
+            raise StopAsyncIteration
+        if isinstance(item, NlsTaskFailed):
+            raise item
+        return item
+
+    async def close(self):
+        """
+        Close connection immediately, unfinished task is finished as failed
+        """
+        __nls, self.__nls = self.__nls, None
+        if self.__read_task:
+            self.__read_task.cancel()
+            self.__read_task = None
+        if __nls:
+            await __nls.close()
+        self.__finish(False)
+
+    async def _start(self, payload, timeout, ping_interval):
+        if self.__completed is not None and not self.__completed.done():
+            # previous task was abandoned, late data must not be mixed into
+            # this one
+            _logging.debug("drop unfinished task %s", self.__task_id)
+            await self.close()
+        if not (self.__keep_alive and self.__nls
+                and self.__nls.is_connected()):
+            await self.close()
+            __nls = AsyncNlsCore(self.__url, self.__akid, self.__aksecret,
+                                 self.__token)
+            try:
+                await __nls.connect(timeout, ping_interval)
+            except (asyncio.TimeoutError, WebSocketException,
+                    OSError) as e:
+                _logging.debug("async connect failed: %s", e)
+                _metrics.incr("nls.errors")
+                await __nls.close()
+                return False
+            self.__nls = __nls
+            self.__read_task = asyncio.ensure_future(self.__read(__nls))
+        loop = asyncio.get_running_loop()
+        self.__task_id = uuid.uuid4().hex
+        self.__queue = asyncio.Queue()
+        self.__started = loop.create_future()
+        self.__completed = loop.create_future()
+        self.__task_start = _metrics.now()
+        self.__first_byte = True
+        if self.__STARTED__ is None:
+            self.__started.set_result(True)
+        await self.__nls.send(self.__request("start", payload), False)
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.__started),
+                                          timeout)
+        except asyncio.TimeoutError:
+            _logging.debug("async start timeout")
+            return False
+
+    async def _stop(self, timeout):
+        if not self.__started_ok():
+            _logging.debug("not start yet...")
+            return False
+        await self.__nls.send(self.__request("stop"), False)
+        return await self._wait_completed(timeout)
+
+    async def _wait_completed(self, timeout):
+        if self.__completed is None:
+            return False
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.__completed),
+                                          timeout)
+        except asyncio.TimeoutError:
+            _logging.debug("wait completed timeout")
+            return False
+
+    async def _ctrl(self, payload):
+        if not self.__started_ok():
+            _logging.debug("not start yet...")
+            return False
+        await self.__nls.send(self.__request("control", payload), False)
+        return True
+
+    async def _send_audio(self, data):
+        if not self.__started_ok():
+            return False
+        try:
+            await self.__nls.send(data, True)
+        except (WebSocketException, OSError) as e:
+            # connection lost while streaming, same as a failed task to
+            # the caller
+            _logging.debug("async send audio failed: %s", e)
+            return False
+        return True
+
+    def __started_ok(self):
+        return self.__nls is not None and \
+            self.__started is not None and self.__started.done() and \
+            self.__started.result() and not self.__completed.done()
+
+    def __request(self, cmd, payload=None):
+        __msg = {
+            "header": {
+                "message_id": uuid.uuid4().hex,
+                "task_id": self.__task_id,
+                "namespace": self.__NAMESPACE__,
+                "name": self.__REQUEST_CMD__[cmd],
+                "appkey": self.__appkey
+            },
+            "context": _util.GetDefaultContext()
+        }
+        if payload is not None:
+            __msg["payload"] = payload
+        return json.dumps(__msg)
+
+    async def __read(self, nls):
+        while True:
+            __item = await nls.recv()
+            if __item is None:
+                break
+            opcode, data = __item
+            if opcode == ABNF.OPCODE_BINARY:
+                if self.__completed is None or self.__completed.done():
+                    _logging.debug("drop data out of task")
+                    continue
+                if self.__first_byte:
+                    self.__first_byte = False
+                    _metrics.since("nls.{}.first_byte".format(self.__METRIC__),
+                                   self.__task_start)
+                self.__queue.put_nowait(data)
+            elif await self.__handle_message(nls, data):
+                break
+        if nls is self.__nls:
+            self.__finish(False)
+
+    async def __handle_message(self, nls, message):
+        # return True if connection is closed after task completed
+        _logging.debug("__handle_message:%s", message)
+        try:
+            __result = json.loads(message)
+        except json.JSONDecodeError:
+            _logging.error("cannot parse message:{}".format(message))
+            return False
+        __header = __result["header"]
+        if __header.get("task_id", self.__task_id) != self.__task_id:
+            _logging.debug("drop message of stale task %s",
+                           __header["task_id"])
+            return False
+        __name = __header["name"]
+        if __name == "TaskFailed":
+            _metrics.incr("nls.{}.errors".format(self.__METRIC__))
+            self.__finish(False, NlsTaskFailed(message))
+        elif __name == self.__COMPLETED__:
+            _metrics.since("nls.{}.total".format(self.__METRIC__),
+                           self.__task_start)
+            self.__finish(True, message if self.__YIELD_MESSAGE__ else None)
+            if not self.__keep_alive:
+                await nls.close()
+                return True
+        elif __name == self.__STARTED__:
+            if not self.__started.done():
+                self.__started.set_result(True)
+            self.__queue.put_nowait(message)
+        elif self.__YIELD_MESSAGE__:
+            self.__queue.put_nowait(message)
+        return False
+
+    def __finish(self, result, item=None):
+        if self.__completed is None or self.__completed.done():
+            return
+        if not self.__started.done():
+            self.__started.set_result(False)
+        self.__completed.set_result(result)
+        if item is not None:
+            self.__queue.put_nowait(item)
+        self.__queue.put_nowait(_END)
+
+
+class AsyncNlsSpeechSynthesizer(_AsyncNlsTask):
+    """
+    Asyncio api for text-to-speech, audio binary is got by async iteration
+
+        async with AsyncNlsSpeechSynthesizer(token=token, appkey=appkey) as syn:
+            if await syn.start(text):
+                async for data in syn:
+                    f.write(data)
+
+    """
+
+    __NAMESPACE__ = "SpeechSynthesizer"
+    __REQUEST_CMD__ = {
+        "start": "StartSynthesis"
+    }
+    __COMPLETED__ = "SynthesisCompleted"
+    __METRIC__ = "synthesis"
+    __YIELD_MESSAGE__ = False
+
+    def __init__(self, url=__URL__,
+                 akid=None, aksecret=None,
+                 token=None, appkey=None,
+                 keep_alive=True):
+        """
+        AsyncNlsSpeechSynthesizer initialization
+
+        Parameters:
+        -----------
+        url: str
+            websocket url.
+        akid: str
+            access id from aliyun. if you provide a token, ignore this argument.
+        aksecret: str
+            access secret key from aliyun. if you provide a token, ignore this
+            argument.
+        token: str
+            access token. if you do not have a token, provide access id and key
+            secret from your aliyun account.
+        appkey: str
+            appkey from aliyun
+        keep_alive: bool
+            whether send next start request on the same connection, default
+            is True. connection is reopened if the previous synthesis was not
+            completed.
+        """
+        super().__init__(url, akid, aksecret, token, appkey, keep_alive)
+        self.__allow_aformat = (
+            "pcm", "wav", "mp3"
+                )
+        self.__allow_sample_rate = (
+            8000, 11025, 16000, 22050,
+            24000, 32000, 44100, 48000
+                )
+
+    async def start(self, text="", voice="xiaoyun",
+                    aformat="pcm", sample_rate=16000,
+                    volume=50, speech_rate=0, pitch_rate=0,
+                    timeout=10, ping_interval=8, ex={}):
+        """
+        Synthesis start, return True once request is sent
+
+        Parameters:
+        -----------
+        text: str
+            utf-8 text
+        voice: str
+            voice for text-to-speech, default is xiaoyun
+        aformat: str
+            audio binary format, support: "pcm", "wav", "mp3", default is "pcm"
+        sample_rate: int
+            audio sample rate, default is 16000, support:8000, 11025, 16000, 22050,
+            24000, 32000, 44100, 48000
+        volume: int
+            audio volume, from 0~100, default is 50
+        speech_rate: int
+            speech rate from -500~500, default is 0
+        pitch_rate: int
+            pitch for voice from -500~500, default is 0
+        timeout: int
+            timeout for connection setup
+        ping_interval: int
+            send ping interval, 0 for disable ping send, default is 8
+        ex: dict
+            dict which will merge into "payload" field in request
+        """
+        if aformat not in self.__allow_aformat:
+            raise ValueError("format {} not support".format(aformat))
+        if sample_rate not in self.__allow_sample_rate:
+            raise ValueError("samplerate {} not support".format(sample_rate))
+        if volume < 0 or volume > 100:
+            raise ValueError("volume {} not support".format(volume))
+        if speech_rate < -500 or speech_rate > 500:
+            raise ValueError("speech_rate {} not support".format(speech_rate))
+        if pitch_rate < -500 or pitch_rate > 500:
+            raise ValueError("pitch rate {} not support".format(pitch_rate))
+        __payload = {
+            "text": text,
+            "voice": voice,
+            "format": aformat,
+            "sample_rate": sample_rate,
+            "volume": volume,
+            "speech_rate": speech_rate,
+            "pitch_rate": pitch_rate
+        }
+        __payload.update(ex)
+        return await self._start(__payload, timeout, ping_interval)
+
+    async def wait_completed(self, timeout=60):
+        """
+        Wait until synthesis completed without reading audio, return False
+        on failure or timeout
+
+        Parameters:
+        -----------
+        timeout: int
+            timeout for waiting completed message from cloud
+        """
+        return await self._wait_completed(timeout)
+
+
+class _AsyncNlsStreamTask(_AsyncNlsTask):
+    """
+    Recognizer and transcriber, audio is sent by send_audio and json format
+    messages are got by async iteration
+    """
+
+    def __init__(self, url, akid, aksecret, token, appkey, keep_alive):
+        super().__init__(url, akid, aksecret, token, appkey, keep_alive)
+        self.__allow_aformat = (
+            "pcm", "opus", "opu"
+        )
+
+    async def start(self, aformat="pcm", sample_rate=16000, ch=1,
+                    enable_intermediate_result=False,
+                    enable_punctuation_prediction=False,
+                    enable_inverse_text_normalization=False,
+                    timeout=10,
+                    ping_interval=8,
+                    ex={}):
+        """
+        Start and wait for started message from cloud
+
+        Parameters:
+        -----------
+        aformat: str
+            audio binary format, support: "pcm", "opu", "opus", default is "pcm"
+        sample_rate: int
+            audio sample rate, default is 16000
+        ch: int
+            audio channels, only support mono which is 1
+        enable_intermediate_result: bool
+            whether enable return intermediate recognition result, default is False
+        enable_punctuation_prediction: bool
+            whether enable punctuation prediction, default is False
+        enable_inverse_text_normalization: bool
+            whether enable ITN, default is False
+        timeout: int
+            wait timeout for connection setup and started message
+        ping_interval: int
+            send ping interval, 0 for disable ping send, default is 8
+        ex: dict
+            dict which will merge into "payload" field in request
+        """
+        if ch != 1:
+            raise ValueError("not support channel: {}".format(ch))
+        if aformat not in self.__allow_aformat:
+            raise ValueError("format {} not support".format(aformat))
+        __payload = {
+            "format": aformat,
+            "sample_rate": sample_rate,
+            "enable_intermediate_result": enable_intermediate_result,
+            "enable_punctuation_prediction": enable_punctuation_prediction,
+            "enable_inverse_text_normalization": enable_inverse_text_normalization
+        }
+        __payload.update(ex)
+        return await self._start(__payload, timeout, ping_interval)
+
+    async def stop(self, timeout=10):
+        """
+        Stop and wait for completed message from cloud
+
+        Parameters:
+        -----------
+        timeout: int
+            timeout for waiting completed message from cloud
+        """
+        return await self._stop(timeout)
+
+    async def send_audio(self, pcm_data):
+        """
+        Send audio binary, audio size prefer 20ms length
+
+        Parameters:
+        -----------
+        pcm_data: bytes
+            audio binary which format is "aformat" in start method
+        """
+        return await self._send_audio(pcm_data)
+
+
+class AsyncNlsSpeechRecognizer(_AsyncNlsStreamTask):
+    """
+    Asyncio api for speech recognition
+
+    """
+
+    __NAMESPACE__ = "SpeechRecognizer"
+    __REQUEST_CMD__ = {
+        "start": "StartRecognition",
+        "stop": "StopRecognition"
+    }
+    __STARTED__ = "RecognitionStarted"
+    __COMPLETED__ = "RecognitionCompleted"
+    __METRIC__ = "recognition"
+
+    def __init__(self, url=__URL__,
+                 akid=None, aksecret=None,
+                 token=None, appkey=None,
+                 keep_alive=False):
+        """
+        AsyncNlsSpeechRecognizer initialization
+
+        Parameters:
+        -----------
+        url: str
+            websocket url.
+        akid: str
+            access id from aliyun. if you provide a token, ignore this argument.
+        aksecret: str
+            access secret key from aliyun. if you provide a token, ignore this
+            argument.
+        token: str
+            access token. if you do not have a token, provide access id and key
+            secret from your aliyun account.
+        appkey: str
+            appkey from aliyun
+        keep_alive: bool
+            whether send next start request on the same connection, default
+            is False
+        """
+        super().__init__(url, akid, aksecret, token, appkey, keep_alive)
+
+
+class AsyncNlsSpeechTranscriber(_AsyncNlsStreamTask):
+    """
+    Asyncio api for realtime speech transcription
+
+    """
+
+    __NAMESPACE__ = "SpeechTranscriber"
+    __REQUEST_CMD__ = {
+        "start": "StartTranscription",
+        "stop": "StopTranscription",
+        "control": "ControlTranscriber"
+    }
+    __STARTED__ = "TranscriptionStarted"
+    __COMPLETED__ = "TranscriptionCompleted"
+    __METRIC__ = "transcription"
+
+    def __init__(self, url=__URL__,
+                 akid=None, aksecret=None,
+                 token=None, appkey=None,
+                 keep_alive=False):
+        """
+        AsyncNlsSpeechTranscriber initialization
+
+        Parameters:
+        -----------
+        url: str
+            websocket url.
+        akid: str
+            access id from aliyun. if you provide a token, ignore this argument.
+        aksecret: str
+            access secret key from aliyun. if you provide a token, ignore this
+            argument.
+        token: str
+            access token. if you do not have a token, provide access id and key
+            secret from your aliyun account.
+        appkey: str
+            appkey from aliyun
+        keep_alive: bool
+            whether send next start request on the same connection, default
+            is False
+        """
+        super().__init__(url, akid, aksecret, token, appkey, keep_alive)
+
+    async def ctrl(self, ex={}):
+        """
+        Send control message to cloud
+
+        Parameters:
+        -----------
+        ex: dict
+            dict which will merge into "payload" field in request
+        """
+        return await self._ctrl(ex)
@@ -128,7 +128,7 @@ class NlsCommonProto:
             self.__on_open(*self.__callback_args)
 
     def __common_core_on_msg(self, msg, *args):
-        _logging.debug("__common_core_on_msg:msg={} args={}".format(msg, args))
+        _logging.debug("__common_core_on_msg:msg=%s args=%s", msg, args)
         self.__handle_message(msg)
 
     def __common_core_on_data(self, data, opcode, flag):
@@ -137,7 +137,7 @@ class NlsCommonProto:
             self.__on_data(data, *self.__callback_args)
 
     def __common_core_on_error(self, msg, *args):
-        _logging.debug("__common_core_on_error:msg={} args={}".format(msg, args))
+        _logging.debug("__common_core_on_error:msg=%s args=%s", msg, args)
 
     def __common_core_on_close(self):
         _logging.debug("__common_core_on_close")
@@ -25,6 +25,7 @@ from . import websocket
 from . import _token
 
 from . import _logging
+from . import _metrics
 
 __URL__ = "wss://nls-gateway.cn-shanghai.aliyuncs.com/ws/v1"
 __HEADER__ = [
@@ -36,19 +37,21 @@ __FORMAT__ = "%(asctime)s - %(levelname)s - %(message)s"
 #__all__ = ["NlsCore"]
 
 def core_on_msg(ws, message, args):
-    _logging.debug("core_on_msg:{}".format(message))
+    _logging.debug("core_on_msg:%s", message)
     if not args:
         _logging.error("callback core_on_msg with null args")
         return
     nls = args[0]
+    _metrics.incr("nls.bytes.received", len(message))
     nls._NlsCore__issue_callback("on_message", [message])
 
 def core_on_error(ws, message, args):
-    _logging.debug("core_on_error:{}".format(message))
+    _logging.debug("core_on_error:%s", message)
     if not args:
         _logging.error("callback core_on_error with null args")
         return
     nls = args[0]
+    _metrics.incr("nls.errors")
     nls._NlsCore__issue_callback("on_error", [message])
 
 def core_on_close(ws, close_status_code, close_msg, args):
@@ -60,7 +63,7 @@ def core_on_close(ws, close_status_code, close_msg, args):
     nls._NlsCore__issue_callback("on_close")
 
 def core_on_open(ws, args):
-    _logging.debug("core_on_open:{}".format(args))
+    _logging.debug("core_on_open:%s", args)
     if not args:
         _logging.debug("callback with null args")
         ws.close()
@@ -73,11 +76,12 @@ def core_on_open(ws, args):
     nls._NlsCore__issue_callback("on_open")
 
 def core_on_data(ws, data, opcode, flag, args):
-    _logging.debug("core_on_data opcode={}".format(opcode))
+    _logging.debug("core_on_data opcode=%s", opcode)
     if not args:
         _logging.error("callback core_on_data with null args")
         return
     nls = args[0]
+    _metrics.incr("nls.bytes.received", len(data))
     nls._NlsCore__issue_callback("on_data", [data, opcode, flag])
 
 @unique
@@ -119,17 +123,13 @@ class NlsCore:
         if not on_open and not on_message and not on_close and not on_error:
             raise ValueError("all callbacks are None, what are you doing?")
 
-        _logging.debug("callback args:{}".format(callback_args))
+        _logging.debug("callback args:%s", callback_args)
         self.__callback_args = callback_args
 
         if self.__get_token:
-            token = _token.getToken(akid, aksecret)
-            _logging.debug("get token {}".format(token))
-            self.__token = token
-        self.__header = __HEADER__ + ["X-NLS-Token: {}".format(self.__token)]
-        websocket.enableTrace(True)
+            self.__token_provider = _token.getTokenProvider(akid, aksecret)
         self.__ws = websocket.WebSocketApp(self.__url,
-                                           self.__header,
+                                           self.__make_header(),
                                            on_message=core_on_msg,
                                            on_data=core_on_data,
                                            on_error=core_on_error,
@@ -140,6 +140,7 @@ class NlsCore:
         self.__cond = threading.Condition()
         self.__connection_status = NlsConnectionStatus.Disconnected
         self.__pending_msg = []
+        self.__connect_start = None
 
     def start(self, msg, ping_interval, ping_timeout):
         self.__lock.acquire()
@@ -147,6 +148,8 @@ class NlsCore:
         self.__ping_timeout = ping_timeout
         if self.__connection_status == NlsConnectionStatus.Disconnected:
             self.__ws.update_args(self, msg)
+            # token may have been refreshed since last connection
+            self.__ws.header = self.__make_header()
             self.__lock.release()
             return self.__connect_before_start(ping_interval, ping_timeout)
         else:
@@ -154,8 +157,15 @@ class NlsCore:
             self.__ws.send(msg)
             return True
 
+    def __make_header(self):
+        if self.__get_token:
+            self.__token = self.__token_provider.get()
+            _logging.debug("get token %s", self.__token)
+        return __HEADER__ + ["X-NLS-Token: {}".format(self.__token)]
+
     def __notify_on_open(self):
         _logging.debug("notify on open")
+        _metrics.since("nls.connect", self.__connect_start)
         with self.__cond:
             self.__connection_status = NlsConnectionStatus.Connected
             self.__cond.notify()
@@ -179,13 +189,17 @@ class NlsCore:
             return False
         else:
             self.__lock.release()
+            _metrics.incr("nls.bytes.sent", len(msg))
             if binary:
                 self.__ws.send(msg, opcode=websocket.ABNF.OPCODE_BINARY)
             else:
-                _logging.debug("send {}".format(msg))
+                _logging.debug("send %s", msg)
                 self.__ws.send(msg)
             return True
     
+    def is_connected(self):
+        return self.__connection_status == NlsConnectionStatus.Connected
+
     def shutdown(self):
         self.__ws.close()
 
@@ -199,6 +213,7 @@ class NlsCore:
 
     def __connect_before_start(self, ping_interval, ping_timeout):
         with self.__cond:
+            self.__connect_start = _metrics.now()
             self.__th = threading.Thread(target=self.__run,
                     args=[ping_interval, ping_timeout])
             self.__th.start()
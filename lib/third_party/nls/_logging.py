@@ -49,7 +49,7 @@ def enableTrace(traceable, handler=logging.StreamHandler()):
     """
     global _traceEnabled
     _traceEnabled = traceable
-    if traceable:
+    if traceable and handler not in _logger.handlers:
         _logger.addHandler(handler)
         _logger.setLevel(logging.DEBUG)
         handler.setFormatter(logging.Formatter(__LOG_FORMAT__))
@@ -66,8 +66,12 @@ def error(msg):
 def warning(msg):
     _logger.warning(msg)
 
-def debug(msg):
-    _logger.debug(msg)
+def debug(msg, *args):
+    """
+    log debug message, args are only merged into msg with "%" operator if
+    debug log is enabled
+    """
+    _logger.debug(msg, *args)
 
 def trace(msg):
     if _traceEnabled:
@@ -77,7 +81,7 @@ def isEnabledForError():
     return _logger.isEnabledFor(logging.ERROR)
 
 def isEnabledForDebug():
-    return _logger.isEnabledFor(logging.Debug)
+    return _logger.isEnabledFor(logging.DEBUG)
 
 def isEnabledForTrace():
     return _traceEnabled
@@ -0,0 +1,202 @@
+"""
+_metrics.py
+
+Opt-in, in-process instrumentation of the nls client. Nothing is recorded
+and no handler is called until enableMetrics(True).
+
+Histograms (seconds):
+    nls.token.fetch             CreateToken round trip
+    nls.connect                 websocket connect and handshake
+    nls.synthesis.first_byte    start() called to first audio byte
+    nls.synthesis.total         start() called to SynthesisCompleted
+    nls.recognition.total       start() called to RecognitionCompleted
+    nls.transcription.total     start() called to TranscriptionCompleted
+
+Counters:
+    nls.bytes.sent, nls.bytes.received
+                                audio bytes and text message characters
+    nls.errors                  websocket errors
+    nls.token.errors, nls.synthesis.errors,
+    nls.recognition.errors, nls.transcription.errors
+"""
+
+
+import math
+import threading
+import time
+
+__all__ = ["enableMetrics", "isEnabledForMetrics",
+           "addMetricsHandler", "removeMetricsHandler",
+           "getMetrics", "resetMetrics", "Counter", "Histogram"]
+
+_enabled = False
+_handlers = []
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+class Counter:
+    """
+    Monotonic counter
+    """
+    def __init__(self):
+        self.value = 0
+
+    def add(self, value=1):
+        self.value += value
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """
+    Log-linear histogram, 8 buckets per power of two so percentiles are
+    accurate to about 9%
+    """
+    __BUCKETS_PER_OCTAVE__ = 8
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.__buckets = {}
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        index = self.__index(value)
+        self.__buckets[index] = self.__buckets.get(index, 0) + 1
+
+    def percentile(self, q):
+        """
+        Upper bound of the bucket holding the q-th percentile, q in [0, 100]
+        """
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for index in sorted(self.__buckets):
+            seen += self.__buckets[index]
+            if seen >= rank:
+                return min(self.__upper(index), self.max)
+        return self.max
+
+    def snapshot(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+    def __index(self, value):
+        if value <= 0:
+            return -math.inf
+        return math.floor(math.log2(value) * self.__BUCKETS_PER_OCTAVE__)
+
+    def __upper(self, index):
+        if index == -math.inf:
+            return 0.0
+        return 2 ** ((index + 1) / self.__BUCKETS_PER_OCTAVE__)
+
+
+def enableMetrics(enabled):
+    """
+    enable metrics recording
+
+    Parameters
+    ----------
+    enabled: bool
+        whether record counters and histograms and call handlers
+    """
+    global _enabled
+    _enabled = enabled
+
+
+def isEnabledForMetrics():
+    return _enabled
+
+
+def addMetricsHandler(handler):
+    """
+    add a handler which is called on every record
+
+    Parameters
+    ----------
+    handler: function
+        handler has three arguments.
+        The 1st argument is kind, "counter" or "histogram".
+        The 2nd argument is metric name.
+        The 3rd argument is recorded value.
+    """
+    with _lock:
+        _handlers.append(handler)
+
+
+def removeMetricsHandler(handler):
+    with _lock:
+        _handlers.remove(handler)
+
+
+def getMetrics():
+    """
+    Return a snapshot of all counters and histograms
+    """
+    with _lock:
+        return {
+            "counters": {k: v.snapshot() for k, v in _counters.items()},
+            "histograms": {k: v.snapshot() for k, v in _histograms.items()},
+        }
+
+
+def resetMetrics():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def now():
+    return time.perf_counter()
+
+
+def incr(name, value=1):
+    if not _enabled:
+        return
+    with _lock:
+        if name not in _counters:
+            _counters[name] = Counter()
+        _counters[name].add(value)
+        handlers = list(_handlers)
+    for handler in handlers:
+        handler("counter", name, value)
+
+
+def observe(name, value):
+    if not _enabled:
+        return
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram()
+        _histograms[name].observe(value)
+        handlers = list(_handlers)
+    for handler in handlers:
+        handler("histogram", name, value)
+
+
+def since(name, start):
+    """
+    observe seconds elapsed since start, start is from now()
+    """
+    if _enabled and start is not None:
+        observe(name, now() - start)
@@ -23,6 +23,7 @@ import threading
 
 from ._core import NlsCore
 from . import _logging
+from . import _metrics
 from . import _util
 
 __SPEECH_RECOGNIZER_NAMESPACE__ = "SpeechRecognizer"
@@ -103,6 +104,7 @@ class NlsSpeechRecognizer:
             "TaskFailed": self.__task_failed
         }
         self.__callback_args = callback_args
+        self.__task_start = None
         self.__appkey = appkey
         self.__url = url
         self.__akid = akid
@@ -139,11 +141,11 @@ class NlsSpeechRecognizer:
         _logging.debug("__sr_core_on_open")
 
     def __sr_core_on_msg(self, msg, *args):
-        _logging.debug("__sr_core_on_msg:msg={} args={}".format(msg, args))
+        _logging.debug("__sr_core_on_msg:msg=%s args=%s", msg, args)
         self.__handle_message(msg)
 
     def __sr_core_on_error(self, msg, *args):
-        _logging.debug("__sr_core_on_error:msg={} args={}".format(msg, args))
+        _logging.debug("__sr_core_on_error:msg=%s args=%s", msg, args)
 
     def __sr_core_on_close(self):
         _logging.debug("__sr_core_on_close")
@@ -168,6 +170,7 @@ class NlsSpeechRecognizer:
 
     def __recognition_completed(self, message):
         _logging.debug("__recognition_completed")
+        _metrics.since("nls.recognition.total", self.__task_start)
         self.__nls.shutdown()
         _logging.debug("__recognition_completed shutdown done")
         if self.__on_completed:
@@ -178,6 +181,7 @@ class NlsSpeechRecognizer:
 
     def __task_failed(self, message):
         _logging.debug("__task_failed")
+        _metrics.incr("nls.recognition.errors")
         with self.__start_cond:
             self.__start_flag = False
             self.__start_cond.notify()
@@ -259,6 +263,7 @@ class NlsSpeechRecognizer:
             "context": _util.GetDefaultContext()
         }
         __jmsg = json.dumps(__msg)
+        self.__task_start = _metrics.now()
         with self.__start_cond:
             if self.__start_flag:
                 _logging.debug("already start...")
@@ -23,6 +23,8 @@ import threading
 
 from ._core import NlsCore
 from . import _logging
+from . import _metrics
+from . import websocket
 from . import _util
 
 __SPEECH_SYNTHESIZER_NAMESPACE__ = "SpeechSynthesizer"
@@ -48,7 +50,10 @@ class NlsSpeechSynthesizer:
                  on_data=None,
                  on_completed=None,
                  on_error=None, on_close=None,
-                 callback_args=[]):
+                 callback_args=[],
+                 keep_alive=False,
+                 idle_timeout=30,
+                 ping_interval=8):
         """
         NlsSpeechSynthesizer initialization
 
@@ -94,6 +99,16 @@ class NlsSpeechSynthesizer:
             The 1st argument is *args which is callback_args.
         callback_args: list
             callback_args will return in callbacks above for *args.
+        keep_alive: bool
+            whether keep the connection open after synthesis completed and
+            send next start request on it, default is False. on_close is
+            only called when the connection is really closed.
+        idle_timeout: int
+            seconds an idle kept-alive connection stays open, default is 30
+        ping_interval: int
+            send ping interval for kept-alive connection, 0 for disable ping
+            send, default is 8. a connection whose pong does not arrive
+            within half of it is closed, and reconnected on next start
         """
 
         self.__response_handler__ = {
@@ -114,6 +129,22 @@ class NlsSpeechSynthesizer:
         self.__on_completed = on_completed
         self.__on_error = on_error
         self.__on_close = on_close
+        self.__keep_alive = keep_alive
+        self.__idle_timeout = idle_timeout
+        self.__ping_interval = ping_interval
+        # without ping_timeout run_forever never checks pongs, and a half
+        # open connection would be kept forever
+        self.__ping_timeout = ping_interval / 2 if ping_interval else None
+        self.__idle_timer = None
+        self.__generation = 0
+        self.__nls = None
+        self.__task_id = None
+        self.__task_done = False
+        self.__task_result = False
+        self.__task_replied = False
+        self.__task_closed = False
+        self.__task_start = None
+        self.__first_byte = False
         self.__allow_aformat = (
             "pcm", "wav", "mp3"
                 )
@@ -126,6 +157,11 @@ class NlsSpeechSynthesizer:
         _logging.debug("__handle_message")
         try:
             __result = json.loads(message)
+            if __result["header"].get("task_id", self.__task_id) != self.__task_id:
+                _logging.debug("drop message of stale task %s",
+                               __result["header"]["task_id"])
+                return
+            self.__task_replied = True
             if __result["header"]["name"] in self.__response_handler__:
                 __handler = self.__response_handler__[__result["header"]["name"]]
                 __handler(message)
@@ -137,30 +173,51 @@ class NlsSpeechSynthesizer:
             _logging.error("cannot parse message:{}".format(message))
             return
 
-    def __syn_core_on_open(self):
+    def __is_stale(self, generation):
+        # callbacks of a connection which has been replaced in keep_alive mode
+        return generation != self.__generation
+
+    def __syn_core_on_open(self, generation):
         _logging.debug("__syn_core_on_open")
+        if self.__is_stale(generation):
+            return
         with self.__start_cond:
             self.__start_flag = True
             self.__start_cond.notify()
 
-    def __syn_core_on_data(self, data, opcode, flag):
+    def __syn_core_on_data(self, data, opcode, flag, generation):
         _logging.debug("__syn_core_on_data")
+        if self.__is_stale(generation):
+            return
+        if self.__keep_alive and not self.__start_flag:
+            _logging.debug("drop data out of task")
+            return
+        self.__task_replied = True
+        if self.__first_byte:
+            self.__first_byte = False
+            _metrics.since("nls.synthesis.first_byte", self.__task_start)
         if self.__on_data:
             self.__on_data(data, *self.__callback_args)
 
-    def __syn_core_on_msg(self, msg, *args):
-        _logging.debug("__syn_core_on_msg:msg={} args={}".format(msg, args))
+    def __syn_core_on_msg(self, msg, generation):
+        _logging.debug("__syn_core_on_msg:msg=%s args=%s", msg, generation)
+        if self.__is_stale(generation):
+            return
         self.__handle_message(msg)
 
-    def __syn_core_on_error(self, msg, *args):
-        _logging.debug("__sr_core_on_error:msg={} args={}".format(msg, args))
+    def __syn_core_on_error(self, msg, generation):
+        _logging.debug("__sr_core_on_error:msg=%s args=%s", msg, generation)
 
-    def __syn_core_on_close(self):
+    def __syn_core_on_close(self, generation):
         _logging.debug("__sr_core_on_close")
+        if self.__is_stale(generation):
+            return
         if self.__on_close:
             self.__on_close(*self.__callback_args)
         with self.__start_cond:
             self.__start_flag = False
+            self.__task_done = True
+            self.__task_closed = True
             self.__start_cond.notify()
 
     def __metainfo(self, message):
@@ -170,21 +227,137 @@ class NlsSpeechSynthesizer:
 
     def __synthesis_completed(self, message):
         _logging.debug("__synthesis_completed")
-        self.__nls.shutdown()
-        _logging.debug("__synthesis_completed shutdown done")
+        _metrics.since("nls.synthesis.total", self.__task_start)
+        # set before shutdown, whose on_close would wake up start() too
+        self.__task_result = True
+        if not self.__keep_alive:
+            self.__nls.shutdown()
+            _logging.debug("__synthesis_completed shutdown done")
         if self.__on_completed:
             self.__on_completed(message, *self.__callback_args)
         with self.__start_cond:
             self.__start_flag = False
+            self.__task_done = True
             self.__start_cond.notify()
+        if self.__keep_alive:
+            self.__schedule_idle_close()
 
     def __task_failed(self, message):
         _logging.debug("__task_failed")
+        _metrics.incr("nls.synthesis.errors")
         with self.__start_cond:
             self.__start_flag = False
+            self.__task_done = True
             self.__start_cond.notify()
         if self.__on_error:
             self.__on_error(message, *self.__callback_args)
+        if self.__keep_alive:
+            self.__schedule_idle_close()
+
+    def __new_core(self):
+        self.__generation += 1
+        return NlsCore(
+            url=self.__url, akid=self.__akid,
+            aksecret=self.__aksecret,
+            token=self.__token,
+            on_open=self.__syn_core_on_open,
+            on_message=self.__syn_core_on_msg,
+            on_data=self.__syn_core_on_data,
+            on_close=self.__syn_core_on_close,
+            on_error=self.__syn_core_on_error,
+            callback_args=[self.__generation])
+
+    def __schedule_idle_close(self):
+        self.__cancel_idle_close()
+        self.__idle_timer = threading.Timer(self.__idle_timeout,
+                                            self.__idle_close)
+        self.__idle_timer.daemon = True
+        self.__idle_timer.start()
+
+    def __cancel_idle_close(self):
+        if self.__idle_timer:
+            self.__idle_timer.cancel()
+            self.__idle_timer = None
+
+    def __idle_close(self):
+        with self.__start_cond:
+            if self.__start_flag or self.__nls is None:
+                return
+            __nls, self.__nls = self.__nls, None
+            self.__generation += 1
+        _logging.debug("close idle connection")
+        __nls.shutdown()
+        if self.__on_close:
+            self.__on_close(*self.__callback_args)
+
+    def __reset_task(self):
+        self.__task_done = False
+        self.__task_result = False
+        self.__task_replied = False
+        self.__task_closed = False
+
+    def __reconnect(self, msg):
+        self.__nls.shutdown()
+        self.__nls = self.__new_core()
+        self.__start_flag = True
+        return self.__nls.start(msg, ping_interval=self.__ping_interval,
+                                ping_timeout=self.__ping_timeout)
+
+    def __begin_task(self, task_id):
+        self.__task_id = task_id
+        self.__task_start = _metrics.now()
+        self.__first_byte = True
+
+    def __start_in_session(self, task_id, msg, wait_complete, timeout):
+        with self.__start_cond:
+            if self.__start_flag:
+                _logging.debug("already start...")
+                return False
+            self.__begin_task(task_id)
+            self.__cancel_idle_close()
+            self.__reset_task()
+            reused = self.__nls is not None and self.__nls.is_connected()
+            if not reused:
+                self.__nls = self.__new_core()
+            self.__start_flag = True
+            try:
+                started = self.__nls.start(msg,
+                        ping_interval=self.__ping_interval,
+                        ping_timeout=self.__ping_timeout)
+            except (websocket.WebSocketException, OSError) as e:
+                _logging.debug("kept-alive connection lost: %s", e)
+                started = False
+            if not started and reused:
+                # connection went away while idle, reconnect transparently
+                started = self.__reconnect(msg)
+            if not started:
+                _logging.debug("nls core start failed")
+                self.__start_flag = False
+                return False
+            if not wait_complete:
+                return True
+            done = self.__start_cond.wait_for(lambda: self.__task_done, timeout)
+            if done and reused and self.__task_closed and not self.__task_replied:
+                # request went to a half open connection, which was closed by
+                # the ping timeout without a reply, send it again
+                _logging.debug("kept-alive connection lost before reply")
+                self.__reset_task()
+                if not self.__reconnect(msg):
+                    self.__start_flag = False
+                    return False
+                done = self.__start_cond.wait_for(lambda: self.__task_done, timeout)
+            if done:
+                return self.__task_result
+            _logging.debug("wait completed timeout")
+            # audio frames carry no task id, drop the connection so that
+            # late data is never mixed into the next task
+            self.__start_flag = False
+            __nls, self.__nls = self.__nls, None
+            self.__generation += 1
+        __nls.shutdown()
+        if self.__on_close:
+            self.__on_close(*self.__callback_args)
+        return False
 
     def start(self, text="", voice="xiaoyun",
               aformat="pcm", sample_rate=16000,
@@ -222,17 +395,6 @@ class NlsSpeechSynthesizer:
         ex: dict
             dict which will merge into "payload" field in request
         """
-        self.__nls = NlsCore(
-            url=self.__url, akid=self.__akid,
-            aksecret=self.__aksecret,
-            token=self.__token,
-            on_open=self.__syn_core_on_open,
-            on_message=self.__syn_core_on_msg,
-            on_data=self.__syn_core_on_data,
-            on_close=self.__syn_core_on_close,
-            on_error=self.__syn_core_on_error,
-            callback_args=[])
-
         if aformat not in self.__allow_aformat:
             raise ValueError("format {} not support".format(aformat))
         if sample_rate not in self.__allow_sample_rate:
@@ -248,11 +410,11 @@ class NlsSpeechSynthesizer:
             raise ValueError("pitch rate {} not support".format(pitch_rate))
 
         __id4 = uuid.uuid4().hex
-        self.__task_id = uuid.uuid4().hex
+        __task_id = uuid.uuid4().hex
 
         __header = {
             "message_id": __id4,
-            "task_id": self.__task_id,
+            "task_id": __task_id,
             "namespace": __SPEECH_SYNTHESIZER_NAMESPACE__,
             "name": __SPEECH_SYNTHESIZER_REQUEST_CMD__["start"],
             "appkey": self.__appkey
@@ -276,10 +438,17 @@ class NlsSpeechSynthesizer:
             "context": _util.GetDefaultContext()    
         }
         __jmsg = json.dumps(__msg)
+        if self.__keep_alive:
+            return self.__start_in_session(__task_id, __jmsg, wait_complete,
+                                           start_timeout + completed_timeout)
         with self.__start_cond:
             if self.__start_flag:
                 _logging.debug("already start...")
                 return False
+            # only a start which is not rejected may take over the task
+            self.__begin_task(__task_id)
+            self.__nls = self.__new_core()
+            self.__task_result = False
             if self.__nls.start(__jmsg, ping_interval=0, ping_timeout=None):
                 if self.__start_flag == False:
                     if not self.__start_cond.wait(start_timeout):
@@ -299,13 +468,15 @@ class NlsSpeechSynthesizer:
                     _logging.debug("wait completed timeout")
                     return False
                 else:
-                    return self.__start_flag == False
+                    return self.__task_result
             else:
                 _logging.debug("wait completed but start flag is false")
-                return True
+                return self.__task_result
 
     def shutdown(self):
         """
         Shutdown connection immediately
         """
-        self.__nls.shutdown()
+        self.__cancel_idle_close()
+        if self.__nls:
+            self.__nls.shutdown()
@@ -23,6 +23,7 @@ import threading
 
 from ._core import NlsCore
 from . import _logging
+from . import _metrics
 from . import _util
 
 __SPEECH_TRANSCRIBER_NAMESPACE__ = "SpeechTranscriber"
@@ -117,6 +118,7 @@ class NlsSpeechTranscriber:
             "TaskFailed": self.__task_failed
         }
         self.__callback_args = callback_args
+        self.__task_start = None
         self.__url = url
         self.__akid = akid
         self.__aksecret = aksecret
@@ -155,11 +157,11 @@ class NlsSpeechTranscriber:
         _logging.debug("__tr_core_on_open")
 
     def __tr_core_on_msg(self, msg, *args):
-        _logging.debug("__tr_core_on_msg:msg={} args={}".format(msg, args))
+        _logging.debug("__tr_core_on_msg:msg=%s args=%s", msg, args)
         self.__handle_message(msg)
 
     def __tr_core_on_error(self, msg, *args):
-        _logging.debug("__tr_core_on_error:msg={} args={}".format(msg, args))
+        _logging.debug("__tr_core_on_error:msg=%s args=%s", msg, args)
 
     def __tr_core_on_close(self):
         _logging.debug("__tr_core_on_close")
@@ -194,6 +196,7 @@ class NlsSpeechTranscriber:
 
     def __transcription_completed(self, message):
         _logging.debug("__transcription_completed")
+        _metrics.since("nls.transcription.total", self.__task_start)
         self.__nls.shutdown()
         _logging.debug("__transcription_completed shutdown done")
         if self.__on_completed:
@@ -204,6 +207,7 @@ class NlsSpeechTranscriber:
 
     def __task_failed(self, message):
         _logging.debug("__task_failed")
+        _metrics.incr("nls.transcription.errors")
         with self.__start_cond:
             self.__start_flag = False
             self.__start_cond.notify()
@@ -285,6 +289,7 @@ class NlsSpeechTranscriber:
             "context": _util.GetDefaultContext()
         }
         __jmsg = json.dumps(__msg)
+        self.__task_start = _metrics.now()
         with self.__start_cond:
             if self.__start_flag:
                 _logging.debug("already start...")
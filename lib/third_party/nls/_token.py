@@ -21,8 +21,40 @@ from aliyunsdkcore.client import AcsClient
 from aliyunsdkcore.request import CommonRequest
 
 import json
+import threading
+import time
 
-__all__ = ["getToken"]
+from . import _logging
+from . import _metrics
+
+__all__ = ["getToken", "TokenProvider", "getTokenProvider", "setTokenUrl"]
+
+_tokenUrl = "nls-meta.cn-shanghai.aliyuncs.com"
+
+
+def _createToken(akid, aksecret, domain="cn-shanghai",
+                 version="2019-02-28",
+                 url="nls-meta.cn-shanghai.aliyuncs.com"):
+    """
+    Call CreateToken once and return (token id, expire time in unix seconds)
+    """
+    client = AcsClient(akid, aksecret, domain)
+    request = CommonRequest()
+    request.set_method('POST')
+    request.set_domain(url)
+    request.set_version(version)
+    request.set_action_name('CreateToken')
+    response = client.do_action_with_exception(request)
+    response_json = json.loads(response)
+    if "Token" in response_json:
+        token = response_json["Token"]
+        if "Id" in token:
+            return token["Id"], token.get("ExpireTime", 0)
+        else:
+            print(f"No id in token:{token}")
+    else:
+        print(f"Token not in response:{response_json}")
+    return None, 0
 
 
 def getToken(akid, aksecret, domain="cn-shanghai",
@@ -46,19 +78,183 @@ def getToken(akid, aksecret, domain="cn-shanghai",
         full url for getting token, default is
         nls-meta.cn-shanghai.aliyuncs.com
     """
-    client = AcsClient(akid, aksecret, domain)
-    request = CommonRequest()
-    request.set_method('POST')
-    request.set_domain(url)
-    request.set_version(version)
-    request.set_action_name('CreateToken')
-    response = client.do_action_with_exception(request)
-    response_json = json.loads(response)
-    if "Token" in response_json:
-        token = response_json["Token"]
-        if "Id" in token:
-            return token["Id"]
-        else:
-            print(f"No id in token:{token}")
-    else:
-        print(f"Token not in response:{response_json}")
+    return _createToken(akid, aksecret, domain, version, url)[0]
+
+
+class TokenProvider:
+    """
+    Thread safe token cache which refreshes the token in background before
+    it expires
+
+    """
+    def __init__(self, akid, aksecret, domain="cn-shanghai",
+                 version="2019-02-28",
+                 url="nls-meta.cn-shanghai.aliyuncs.com",
+                 refresh_ahead=600, min_ttl=60, retry_interval=30):
+        """
+        TokenProvider initialization
+
+        Parameters:
+        -----------
+        akid: str
+            access id from aliyun
+        aksecret: str
+            access secret key from aliyun
+        domain: str:
+            default is cn-shanghai
+        version: str:
+            default is 2019-02-28
+        url: str
+            full url for getting token, default is
+            nls-meta.cn-shanghai.aliyuncs.com
+        refresh_ahead: int
+            seconds before expire time to refresh the token in background,
+            default is 600
+        min_ttl: int
+            token which expires within min_ttl seconds is never handed out,
+            caller blocks on a refresh instead, default is 60
+        retry_interval: int
+            seconds to wait before retrying a failed background refresh,
+            default is 30
+        """
+        self.__args = (akid, aksecret, domain, version, url)
+        self.__refresh_ahead = refresh_ahead
+        self.__min_ttl = min_ttl
+        self.__retry_interval = retry_interval
+        self.__cond = threading.Condition()
+        self.__token = None
+        self.__expire_time = 0
+        self.__refreshing = False
+        self.__timer = None
+
+    @property
+    def expire_time(self):
+        return self.__expire_time
+
+    def get(self):
+        """
+        Return a valid token, calling CreateToken only when the cached one is
+        missing or about to expire. Concurrent callers share one request.
+        """
+        with self.__cond:
+            if self.__is_valid():
+                return self.__token
+        return self.refresh(force=False)
+
+    def refresh(self, force=True):
+        """
+        Fetch a new token. If another thread is already fetching, wait for
+        its result instead of sending a second request.
+
+        Parameters:
+        -----------
+        force: bool
+            refresh even if the cached token is still valid
+        """
+        with self.__cond:
+            if self.__refreshing:
+                self.__cond.wait_for(lambda: not self.__refreshing)
+                return self.__token
+            if not force and self.__is_valid():
+                return self.__token
+            self.__refreshing = True
+        token, expire_time = None, 0
+        start = _metrics.now()
+        try:
+            token, expire_time = _createToken(*self.__args)
+        finally:
+            _metrics.since("nls.token.fetch", start)
+            with self.__cond:
+                if token:
+                    self.__token = token
+                    self.__expire_time = expire_time
+                    self.__schedule(
+                        expire_time - self.__refresh_ahead - time.time())
+                else:
+                    _metrics.incr("nls.token.errors")
+                self.__refreshing = False
+                self.__cond.notify_all()
+        _logging.debug("token refreshed, expire at %s", expire_time)
+        return self.__token
+
+    def close(self):
+        """
+        Stop background refresh
+        """
+        with self.__cond:
+            if self.__timer:
+                self.__timer.cancel()
+                self.__timer = None
+
+    def __is_valid(self):
+        return self.__token is not None and \
+            time.time() < self.__expire_time - self.__min_ttl
+
+    def __schedule(self, delay):
+        if self.__timer:
+            self.__timer.cancel()
+        self.__timer = threading.Timer(max(delay, self.__retry_interval),
+                                       self.__background_refresh)
+        self.__timer.daemon = True
+        self.__timer.start()
+
+    def __background_refresh(self):
+        expire_time = self.__expire_time
+        try:
+            self.refresh(force=True)
+        except Exception as e:
+            _logging.error("background token refresh failed:{}".format(e))
+        with self.__cond:
+            # keep retrying while the old token is still usable
+            if self.__expire_time == expire_time and \
+                    time.time() < expire_time:
+                self.__schedule(self.__retry_interval)
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def setTokenUrl(url):
+    """
+    Set url for getting token used by getTokenProvider, e.g. a local server
+    like "http://127.0.0.1:8080" for testing
+
+    Parameters:
+    -----------
+    url: str
+        full url for getting token
+    """
+    global _tokenUrl
+    _tokenUrl = url
+
+
+def getTokenProvider(akid, aksecret, domain="cn-shanghai",
+                     version="2019-02-28",
+                     url=None):
+    """
+    Return the process wide TokenProvider shared by all callers with the same
+    account and endpoint
+
+    Parameters:
+    -----------
+    akid: str
+        access id from aliyun
+    aksecret: str
+        access secret key from aliyun
+    domain: str:
+        default is cn-shanghai
+    version: str:
+        default is 2019-02-28
+    url: str
+        full url for getting token, default is the one set by setTokenUrl,
+        nls-meta.cn-shanghai.aliyuncs.com if not set
+    """
+    if url is None:
+        url = _tokenUrl
+    key = (akid, aksecret, domain, version, url)
+    with _providers_lock:
+        if key not in _providers:
+            _providers[key] = TokenProvider(akid, aksecret, domain,
+                                            version, url)
+        return _providers[key]
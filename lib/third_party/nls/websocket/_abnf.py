@@ -20,7 +20,6 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-import array
 import os
 import struct
 import sys
@@ -43,12 +42,41 @@ except ImportError:
     # wsaccel is not available, use websocket-client _mask()
     native_byteorder = sys.byteorder
 
-    def _mask(mask_value, data_value):
+    def _mask_int(mask_value, data_value):
         datalen = len(data_value)
         data_value = int.from_bytes(data_value, native_byteorder)
         mask_value = int.from_bytes(mask_value * (datalen // 4) + mask_value[: datalen % 4], native_byteorder)
         return (data_value ^ mask_value).to_bytes(datalen, native_byteorder)
 
+    try:
+        # If numpy is available, xor the payload 4 bytes at a time.
+        import numpy
+
+        # Below this size the numpy call overhead outweighs the vectorized xor.
+        _NUMPY_MASK_THRESHOLD = 512
+
+        def _mask_numpy(mask_value, data_value):
+            datalen = len(data_value)
+            aligned = datalen - datalen % 4
+            masked = numpy.empty(datalen, dtype=numpy.uint8)
+            numpy.bitwise_xor(
+                numpy.frombuffer(data_value, dtype=numpy.uint32, count=aligned // 4),
+                numpy.frombuffer(mask_value, dtype=numpy.uint32),
+                out=masked[:aligned].view(numpy.uint32))
+            if aligned < datalen:
+                masked[aligned:] = numpy.bitwise_xor(
+                    numpy.frombuffer(data_value, dtype=numpy.uint8, offset=aligned),
+                    numpy.frombuffer(mask_value, dtype=numpy.uint8, count=datalen - aligned))
+            return masked.tobytes()
+
+        def _mask(mask_value, data_value):
+            if len(data_value) < _NUMPY_MASK_THRESHOLD:
+                return _mask_int(mask_value, data_value)
+            return _mask_numpy(mask_value, data_value)
+
+    except ImportError:
+        _mask = _mask_int
+
 
 __all__ = [
     'ABNF', 'continuous_frame', 'frame_buffer',
@@ -234,7 +262,11 @@ class ABNF:
             return frame_header + self.data
         else:
             mask_key = self.get_mask_key(4)
-            return frame_header + self._get_masked(mask_key)
+            if isinstance(mask_key, str):
+                mask_key = mask_key.encode('utf-8')
+            # join once instead of concatenating the payload twice
+            return b"".join((frame_header, mask_key,
+                             ABNF.mask(mask_key, self.data)))
 
     def _get_masked(self, mask_key):
         s = ABNF.mask(mask_key, self.data)
@@ -265,19 +297,25 @@ class ABNF:
         if isinstance(data, str):
             data = data.encode('latin-1')
 
-        return _mask(array.array("B", mask_key), array.array("B", data))
+        return _mask(bytes(mask_key), data)
 
 
 class frame_buffer:
     _HEADER_MASK_INDEX = 5
     _HEADER_LENGTH_INDEX = 6
+    _RECV_BUFFER_SIZE = 1 << 16
+    _RECV_BUFFER_MAX = 1 << 22
 
-    def __init__(self, recv_fn, skip_utf8_validation):
+    def __init__(self, recv_fn, skip_utf8_validation, recv_into_fn=None):
         self.recv = recv_fn
+        self.recv_into = recv_into_fn
         self.skip_utf8_validation = skip_utf8_validation
         # Buffers over the packets from the layer beneath until desired amount
-        # bytes of bytes are received.
-        self.recv_buffer = []
+        # bytes of bytes are received. Packets are read straight into
+        # recv_buffer[:recv_count], which is reused for every read and only
+        # grows when a read does not fit in it.
+        self.recv_buffer = bytearray(frame_buffer._RECV_BUFFER_SIZE)
+        self.recv_count = 0
         self.clear()
         self.lock = Lock()
 
@@ -361,26 +399,40 @@ class frame_buffer:
         return frame
 
     def recv_strict(self, bufsize):
-        shortage = bufsize - sum(map(len, self.recv_buffer))
-        while shortage > 0:
-            # Limit buffer size that we pass to socket.recv() to avoid
-            # fragmenting the heap -- the number of bytes recv() actually
-            # reads is limited by socket buffer and is relatively small,
-            # yet passing large numbers repeatedly causes lots of large
-            # buffers allocated and then shrunk, which results in
-            # fragmentation.
-            bytes_ = self.recv(min(16384, shortage))
-            self.recv_buffer.append(bytes_)
-            shortage -= len(bytes_)
-
-        unified = bytes("", 'utf-8').join(self.recv_buffer)
-
-        if shortage == 0:
-            self.recv_buffer = []
-            return unified
-        else:
-            self.recv_buffer = [unified[bufsize:]]
-            return unified[:bufsize]
+        if len(self.recv_buffer) < bufsize:
+            # Large payload, keep the bytes received so far and grow the
+            # buffer to hold the rest.
+            recv_buffer = bytearray(bufsize)
+            recv_buffer[:self.recv_count] = \
+                memoryview(self.recv_buffer)[:self.recv_count]
+            self.recv_buffer = recv_buffer
+
+        view = memoryview(self.recv_buffer)
+        # Never read past bufsize: bytes left in this buffer would be
+        # invisible to the select() based dispatchers.
+        while self.recv_count < bufsize:
+            self.recv_count += self._recv_into(view[self.recv_count:bufsize])
+        data = view[:bufsize].tobytes()
+        view.release()
+
+        self.recv_count = 0
+        if bufsize > frame_buffer._RECV_BUFFER_MAX:
+            # Do not hold on to the memory of an exceptionally large frame.
+            self.recv_buffer = bytearray(frame_buffer._RECV_BUFFER_SIZE)
+        return data
+
+    def _recv_into(self, view):
+        if self.recv_into:
+            return self.recv_into(view, len(view))
+        # Limit buffer size that we pass to socket.recv() to avoid
+        # fragmenting the heap -- the number of bytes recv() actually
+        # reads is limited by socket buffer and is relatively small,
+        # yet passing large numbers repeatedly causes lots of large
+        # buffers allocated and then shrunk, which results in
+        # fragmentation.
+        bytes_ = self.recv(min(16384, len(view)))
+        view[:len(bytes_)] = bytes_
+        return len(bytes_)
 
 
 class continuous_frame:
@@ -93,7 +93,8 @@ class WebSocket:
         self.connected = False
         self.get_mask_key = get_mask_key
         # These buffer over the build-up of a single frame.
-        self.frame_buffer = frame_buffer(self._recv, skip_utf8_validation)
+        self.frame_buffer = frame_buffer(self._recv, skip_utf8_validation,
+                                         self._recv_into)
         self.cont_frame = continuous_frame(
             fire_cont_frame, skip_utf8_validation)
 
@@ -303,6 +304,8 @@ class WebSocket:
             frame.get_mask_key = self.get_mask_key
         data = frame.format()
         length = len(data)
+        # slicing a memoryview does not copy the unsent remainder
+        data = memoryview(data)
         #if (isEnabledForTrace() and f):
             #trace("++Sent raw: " + repr(data))
             #trace("++Sent decoded: " + frame.__str__())
@@ -534,6 +537,16 @@ class WebSocket:
             self.connected = False
             raise
 
+    def _recv_into(self, buffer, nbytes):
+        try:
+            return recv_into(self.sock, buffer, nbytes)
+        except WebSocketConnectionClosedException:
+            if self.sock:
+                self.sock.close()
+            self.sock = None
+            self.connected = False
+            raise
+
 
 def create_connection(url, timeout=None, class_=WebSocket, **options):
     """
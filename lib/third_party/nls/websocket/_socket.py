@@ -41,7 +41,7 @@ DEFAULT_SOCKET_OPTION = [(socket.SOL_TCP, socket.TCP_NODELAY, 1)]
 _default_timeout = None
 
 __all__ = ["DEFAULT_SOCKET_OPTION", "sock_opt", "setdefaulttimeout", "getdefaulttimeout",
-           "recv", "recv_line", "send"]
+           "recv", "recv_into", "recv_line", "send"]
 
 
 class sock_opt:
@@ -128,6 +128,58 @@ def recv(sock, bufsize):
     return bytes_
 
 
+def recv_into(sock, buffer, nbytes):
+    if not sock:
+        raise WebSocketConnectionClosedException("socket is already closed.")
+
+    if not hasattr(sock, "recv_into"):
+        bytes_ = recv(sock, nbytes)
+        buffer[:len(bytes_)] = bytes_
+        return len(bytes_)
+
+    def _recv_into():
+        try:
+            return sock.recv_into(buffer, nbytes)
+        except SSLWantReadError:
+            pass
+        except socket.error as exc:
+            error_code = extract_error_code(exc)
+            if error_code is None:
+                raise
+            if error_code != errno.EAGAIN or error_code != errno.EWOULDBLOCK:
+                raise
+
+        sel = selectors.DefaultSelector()
+        sel.register(sock, selectors.EVENT_READ)
+
+        r = sel.select(sock.gettimeout())
+        sel.close()
+
+        if r:
+            return sock.recv_into(buffer, nbytes)
+
+    try:
+        if sock.gettimeout() == 0:
+            length = sock.recv_into(buffer, nbytes)
+        else:
+            length = _recv_into()
+    except socket.timeout as e:
+        message = extract_err_message(e)
+        raise WebSocketTimeoutException(message)
+    except SSLError as e:
+        message = extract_err_message(e)
+        if isinstance(message, str) and 'timed out' in message:
+            raise WebSocketTimeoutException(message)
+        else:
+            raise
+
+    if not length:
+        raise WebSocketConnectionClosedException(
+            "Connection to remote host was lost.")
+
+    return length
+
+
 def recv_line(sock):
     line = []
     while True:
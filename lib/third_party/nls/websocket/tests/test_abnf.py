@@ -84,6 +84,51 @@ class ABNFTest(unittest.TestCase):
         self.assertEqual(fb.mask, None)
         self.assertEqual(fb.has_mask(), False)
 
+    def testMaskBackends(self):
+        mask_key = b'\x01\x8a\xcc\x7f'
+        for length in (0, 1, 3, 4, 5, 511, 512, 513, 4097):
+            data = bytes(range(256)) * (length // 256) + bytes(range(length % 256))
+            expected = bytes(b ^ mask_key[i % 4] for i, b in enumerate(data))
+            self.assertEqual(ABNF.mask(mask_key, data), expected)
+            self.assertEqual(ABNF.mask(mask_key, ABNF.mask(mask_key, data)), data)
+            if hasattr(ws._abnf, '_mask_numpy'):
+                self.assertEqual(ws._abnf._mask_numpy(mask_key, data), expected)
+
+    def testFrameBufferRecvStrict(self):
+        packets = [b'ab', b'cdef', b'g' * 70000, b'hi', b'j' * (1 << 23)]
+
+        def recv(bufsize):
+            packet = packets.pop(0)
+            if len(packet) > bufsize:
+                packets.insert(0, packet[bufsize:])
+            return packet[:bufsize]
+
+        fb = frame_buffer(recv, True)
+        self.assertEqual(fb.recv_strict(3), b'abc')
+        self.assertEqual(fb.recv_strict(70003), b'def' + b'g' * 70000)
+        self.assertEqual(len(fb.recv_buffer), 70003)
+        self.assertEqual(fb.recv_strict(2), b'hi')
+        self.assertEqual(fb.recv_strict(1 << 23), b'j' * (1 << 23))
+        self.assertEqual(len(fb.recv_buffer), frame_buffer._RECV_BUFFER_SIZE)
+
+    def testFrameBufferRecvInto(self):
+        payload = bytes(range(256)) * 300
+        packets = [ABNF(1, 0, 0, 0, ABNF.OPCODE_BINARY, 0, payload).format()]
+
+        def recv_into(buffer, nbytes):
+            packet = packets.pop(0)
+            length = min(len(packet), nbytes, 1000)
+            buffer[:length] = packet[:length]
+            if length < len(packet):
+                packets.insert(0, packet[length:])
+            return length
+
+        fb = frame_buffer(None, True, recv_into)
+        frame = fb.recv_frame()
+        self.assertEqual(frame.opcode, ABNF.OPCODE_BINARY)
+        self.assertEqual(frame.data, payload)
+        self.assertEqual(packets, [])
+
 
 if __name__ == "__main__":
     unittest.main()
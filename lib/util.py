@@ -0,0 +1,30 @@
+__all__ = ['RateLimiter']
+
+
+import threading
+import time
+import typing as t
+
+
+class RateLimiter:
+    '''Token bucket shared by threads, `rate=None` disables limiting'''
+
+    def __init__(self, rate: t.Optional[float] = None, burst: int = 1) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self._rate is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens+(now-self._last)*self._rate)
+            self._last = now
+            # 令牌可以预支, 等待时间按欠下的令牌数计算
+            self._tokens -= 1
+            delay = -self._tokens / self._rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
@@ -1,9 +1,7 @@
 import json
 import pathlib as p
 
-import ffmpeg
-
-from lib import ASR, OSS
+from lib import ASR, OSS, FileTrans, Journal
 
 
 paths = [
@@ -14,27 +12,9 @@ config = json.loads(next(filter(lambda p: p.exists(), paths)).read_text())
 ASR.register(**config['auth'], **config['asr'])
 OSS.register(**config['auth'], **config['oss'])
 
-for src in p.Path('data', 'filetrans').iterdir():
-    if src.is_file() and not (src.parent/src.stem).exists():
-        print(f'Path: {src}')
-
-        dst = src.parent / f'{src.stem}.wav'
-        ffmpeg \
-            .input(src.as_posix()) \
-            .output(
-                dst.as_posix(),
-                acodec='pcm_s16le', ac=1, ar=16000, vn=None,
-            ) \
-            .run()
-
-        with OSS(dst) as oss:
-            ASR(oss.url) \
-                .upload() \
-                .polling() \
-                .to(
-                    src.parent / src.stem / 'main.srt',
-                    src.parent / src.stem / 'main.txt',
-                    src.parent / src.stem / 'main.backup',
-                )
-
-        dst.unlink()
+srcs = [
+    src
+    for src in p.Path('data', 'filetrans').iterdir()
+    if src.is_file() and not (src.parent/src.stem).exists()
+]
+FileTrans(journal=Journal(p.Path('data', '.cache', 'filetrans'))).run(srcs)
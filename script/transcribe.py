@@ -0,0 +1,20 @@
+import json
+import pathlib as p
+
+from lib import Transcriber
+
+
+paths = [
+    p.Path('config', 'private.json'),
+    p.Path('config', 'public.json'),
+]
+config = json.loads(next(filter(lambda p: p.exists(), paths)).read_text())
+Transcriber.register(**config['auth'], **config['nls'])
+
+transcriber = Transcriber()
+for src in p.Path('data', 'filetrans').iterdir():
+    if src.is_file() and not (src.parent/src.stem).exists():
+        print(f'Path: {src}')
+        asr = transcriber.run(src)
+        if asr is not None:
+            asr.to(*(src.parent/src.stem/name for name in ('main.srt', 'main.txt', 'main.backup')))
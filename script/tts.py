@@ -2,6 +2,7 @@
 import json
 import pathlib as p
 
+from lib.cache import Cache
 from lib.nls import NLS
 
 
@@ -13,14 +14,21 @@ config = json.loads(next(filter(lambda p: p.exists(), paths)).read_text())
 NLS.register(**config['auth'], **config['nls'])
 
 format = 'mp3'
-nls = NLS(format=format, speaker='lydia', verbose=True)
+cache = Cache(p.Path('data', '.cache', 'tts'))
+nls = NLS(format=format, speaker='lydia', verbose=False, keep_alive=True, cache=cache)
 for src in p.Path('data', 'tts').iterdir():
     if src.is_file() and src.suffix=='.txt' and not (src.parent/src.stem).exists():
         print(f'Path: {src}')
         directory = src.parent / src.stem
         directory.mkdir(parents=True, exist_ok=True)
 
-        for ith, line in enumerate(src.read_text().splitlines()):
-            path = directory / f'{ith+1}.{format}'
-            if line and not path.exists():
-                nls.tts(line, path)
+        items = [
+            (line, directory/f'{ith+1}.{format}')
+            for ith, line in enumerate(src.read_text().splitlines())
+            if line and not (directory/f'{ith+1}.{format}').exists()
+        ]
+        for result in nls.tts_many(items, workers=4):
+            if not result.ok:
+                print(f'Failed: {result.path} ({result.error})')
+nls.close()
+print(f'Cache: {cache.stats}')